@@ -180,8 +180,10 @@ class Expander(object):
 
         for word, weight in iteritems(self.topN_weight):
             btext = field.to_bytes(word)
-            if (fieldname, btext) in ixreader:
-                cf = ixreader.frequency(fieldname, btext)
+            # frequency() is 0 for a term that isn't in the index, so there's
+            # no need to look the term up a second time to check
+            cf = ixreader.frequency(fieldname, btext)
+            if cf:
                 score = model.score(weight, cf, self.top_total)
                 if score > maxweight:
                     maxweight = score
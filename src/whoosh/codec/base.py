@@ -33,7 +33,7 @@ from bisect import bisect_right
 
 from whoosh import columns
 from whoosh.automata import lev
-from whoosh.compat import abstractmethod, izip, unichr, xrange
+from whoosh.compat import abstractmethod, filterfalse, izip, unichr, xrange
 from whoosh.filedb.compound import CompoundStorage
 from whoosh.system import emptybytes
 from whoosh.util import random_name
@@ -142,14 +142,7 @@ class PerDocumentWriter(object):
         raise NotImplementedError
 
     def add_vector_matcher(self, fieldname, fieldobj, vmatcher):
-        def readitems():
-            while vmatcher.is_active():
-                text = vmatcher.id()
-                weight = vmatcher.weight()
-                valuestring = vmatcher.value()
-                yield (text, weight, valuestring)
-                vmatcher.next()
-        self.add_vector_items(fieldname, fieldobj, readitems())
+        self.add_vector_items(fieldname, fieldobj, vmatcher.all_postings())
 
     def finish_doc(self):
         pass
@@ -324,6 +317,13 @@ class TermsReader(object):
     def items_from(self, fieldname, prefix):
         raise NotImplementedError
 
+    def term_stats_from(self, fieldname, prefix):
+        # Yields ((fieldname, text), weight, doc frequency) tuples starting at
+        # the given term. Codecs can override this to read the two numbers
+        # without building a whole TermInfo for every term
+        return ((term, ti.weight(), ti.doc_frequency())
+                for term, ti in self.items_from(fieldname, prefix))
+
     @abstractmethod
     def term_info(self, fieldname, text):
         raise NotImplementedError
@@ -410,9 +410,14 @@ class PerDocumentReader(object):
         Returns an iterator of all (undeleted) document IDs in the reader.
         """
 
-        is_deleted = self.is_deleted
-        return (docnum for docnum in xrange(self.doc_count_all())
-                if not is_deleted(docnum))
+        doccount = self.doc_count_all()
+        if not self.has_deletions():
+            return iter(xrange(doccount))
+
+        # Check the document numbers against a snapshot of the deleted set,
+        # which itertools can do without calling is_deleted() for each one
+        deleted = frozenset(self.deleted_docs())
+        return filterfalse(deleted.__contains__, xrange(doccount))
 
     def iter_docs(self):
         for docnum in self.all_doc_ids():
@@ -728,9 +733,15 @@ class MultiPerDocumentReader(PerDocumentReader):
         return max(0, bisect_right(self._doc_offsets, docnum) - 1)
 
     def _reader_and_docnum(self, docnum):
-        rnum = self._document_reader(docnum)
-        offset = self._doc_offsets[rnum]
-        return rnum, docnum - offset
+        # Called for every per-document lookup, so do the search inline
+        # instead of through _document_reader()
+        offsets = self._doc_offsets
+        if len(offsets) < 2:
+            return 0, docnum
+        rnum = bisect_right(offsets, docnum) - 1
+        if rnum < 0:
+            rnum = 0
+        return rnum, docnum - offsets[rnum]
 
     # Deletions
 
@@ -760,19 +771,18 @@ class MultiPerDocumentReader(PerDocumentReader):
         if not self.has_column(fieldname):
             raise ValueError("No column %r" % (fieldname,))
 
-        default = column.default_value()
-        colreaders = []
-        for r in self._readers:
+        items = []
+        for r, offset in izip(self._readers, self._doc_offsets):
             if r.has_column(fieldname):
-                cr = r.column_reader(fieldname, column)
-            else:
-                cr = columns.EmptyColumnReader(default, r.doc_count_all())
-            colreaders.append(cr)
+                items.append((offset, r.column_reader(fieldname, column)))
 
-        if len(colreaders) == 1:
-            return colreaders[0]
+        if len(items) == len(self._readers) == 1:
+            return items[0][1]
         else:
-            return columns.MultiColumnReader(colreaders)
+            # The combined reader returns the default for the documents in
+            # the readers without the column
+            return columns.MultiColumnReader.from_sparse(
+                items, self._doccount, column.default_value())
 
     # Lengths
 
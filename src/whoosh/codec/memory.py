@@ -180,7 +180,8 @@ class MemPerDocReader(base.PerDocumentReader):
         return ListMatcher(ids, weights, values, format_)
 
     def stored_fields(self, docnum):
-        return self._segment._stored[docnum]
+        # Return a copy so the caller can't change the segment's dictionary
+        return dict(self._segment._stored[docnum])
 
     def close(self):
         pass
@@ -35,7 +35,7 @@ from collections import defaultdict
 
 from whoosh import columns, formats
 from whoosh.compat import b, bytes_type, string_type, integer_types
-from whoosh.compat import dumps, loads, iteritems, xrange
+from whoosh.compat import dumps, loads, iteritems, izip, xrange
 from whoosh.codec import base
 from whoosh.filedb import compound, filetables
 from whoosh.matching import ListMatcher, ReadTooFar, LeafMatcher
@@ -44,6 +44,7 @@ from whoosh.system import emptybytes
 from whoosh.system import _SHORT_SIZE, _INT_SIZE, _LONG_SIZE, _FLOAT_SIZE
 from whoosh.system import pack_ushort, unpack_ushort
 from whoosh.system import pack_int, unpack_int, pack_long, unpack_long
+from whoosh.util.cache import bounded_cache
 from whoosh.util.numlists import delta_encode, delta_decode
 from whoosh.util.numeric import length_to_byte, byte_to_length
 
@@ -497,6 +498,21 @@ class W3PerDocReader(base.PerDocumentReader):
             v = {}
         return v
 
+    def iter_docs(self):
+        # Read the stored fields column from start to finish instead of
+        # looking up each document's offset and seeking to it
+        reader = self._cached_reader("_stored", STORED_COLUMN)
+        deleted = ()
+        if self.has_deletions():
+            deleted = frozenset(self.deleted_docs())
+        for docnum, v in enumerate(reader):
+            if docnum not in deleted:
+                yield docnum, {} if v is None else v
+
+    def all_stored_fields(self):
+        for _, v in self.iter_docs():
+            yield v
+
 
 class W3FieldCursor(base.FieldCursor):
     def __init__(self, tindex, fieldname, keycoder, keydecoder, fieldobj):
@@ -556,6 +572,10 @@ class W3FieldCursor(base.FieldCursor):
         return self._pos is not None
 
 
+# The leading flags, total weight and doc frequency of W3TermInfo's encoding
+_TERMSTATS_STRUCT = struct.Struct("!BfI")
+
+
 class W3TermsReader(base.TermsReader):
     def __init__(self, codec, dbfile, length, postfile):
         self._codec = codec
@@ -568,6 +588,20 @@ class W3TermsReader(base.TermsReader):
         for fieldname, num in iteritems(self._fieldmap):
             self._fieldunmap[num] = fieldname
 
+        # Each membership test is a hash lookup in the terms file; queries
+        # tend to test the same terms over and over, and the file never
+        # changes, so remember recent answers. The cached function doesn't
+        # refer back to this object, so the cache doesn't keep it alive
+        fieldmap = self._fieldmap
+        tindex = self._tindex
+
+        def has_term(term):
+            fieldname, tbytes = term
+            fnum = fieldmap.get(fieldname, 65535)
+            return pack_ushort(fnum) + tbytes in tindex
+
+        self._has_term = bounded_cache(4096)(has_term)
+
     def _keycoder(self, fieldname, tbytes):
         assert isinstance(tbytes, bytes_type), "tbytes=%r" % tbytes
         fnum = self._fieldmap.get(fieldname, 65535)
@@ -581,7 +615,7 @@ class W3TermsReader(base.TermsReader):
         return self._tindex.range_for_key(self._keycoder(fieldname, tbytes))
 
     def __contains__(self, term):
-        return self._keycoder(*term) in self._tindex
+        return self._has_term(term)
 
     def indexed_field_names(self):
         return self._fieldmap.keys()
@@ -615,6 +649,17 @@ class W3TermsReader(base.TermsReader):
         return ((keydecoder(keybytes), tidecoder(valbytes))
                 for keybytes, valbytes in self._tindex.items_from(prefixbytes))
 
+    def term_stats_from(self, fieldname, prefix):
+        # Unpack just the flags, weight and doc frequency from the front of
+        # each term info, instead of decoding the whole thing (which includes
+        # unpickling the postings of inlined terms)
+        prefixbytes = self._keycoder(fieldname, prefix)
+        keydecoder = self._keydecoder
+        unpack = _TERMSTATS_STRUCT.unpack_from
+        for keybytes, valbytes in self._tindex.items_from(prefixbytes):
+            _, weight, df = unpack(valbytes)
+            yield keydecoder(keybytes), weight, df
+
     def term_info(self, fieldname, tbytes):
         key = self._keycoder(fieldname, tbytes)
         try:
@@ -1011,6 +1056,26 @@ class W3LeafMatcher(LeafMatcher):
         else:
             return False
 
+    def all_postings(self):
+        # Zip together the IDs, weights and values of a whole block at a time,
+        # instead of calling id(), weight() and value() for every posting
+        while self.is_active():
+            if self._ids is None:
+                self._read_ids()
+            if self._weights is None:
+                self._read_weights()
+            if self._values is None:
+                self._read_values()
+
+            i = self._i
+            for posting in izip(self._ids[i:], self._weights[i:],
+                                self._values[i:]):
+                yield posting
+
+            # Move to the next block
+            self._i = self._blocklength - 1
+            self.next()
+
     def skip_to(self, targetid):
         # Skip to the next ID equal to or greater than the given target ID
 
@@ -1134,6 +1199,8 @@ class W3TermInfo(TermInfo):
     # I   | Maximum (last) ID
     _struct = struct.Struct("!BfIBBfII")
 
+    __slots__ = ("_offset", "_length", "_inlined")
+
     def __init__(self, *args, **kwargs):
         TermInfo.__init__(self, *args, **kwargs)
         self._offset = None
@@ -1200,17 +1267,12 @@ class W3TermInfo(TermInfo):
     @classmethod
     def from_bytes(cls, s):
         st = cls._struct
-        vals = st.unpack(s[:st.size])
-        terminfo = cls()
-
-        flags = vals[0]
-        terminfo._weight = vals[1]
-        terminfo._df = vals[2]
-        terminfo._minlength = byte_to_length(vals[3])
-        terminfo._maxlength = byte_to_length(vals[4])
-        terminfo._maxweight = vals[5]
-        terminfo._minid = None if vals[6] == 0xffffffff else vals[6]
-        terminfo._maxid = None if vals[7] == 0xffffffff else vals[7]
+        (flags, weight, df, minlength, maxlength, maxweight, minid,
+         maxid) = st.unpack(s[:st.size])
+        terminfo = cls(weight, df, byte_to_length(minlength),
+                       byte_to_length(maxlength), maxweight,
+                       None if minid == 0xffffffff else minid,
+                       None if maxid == 0xffffffff else maxid)
 
         if flags:
             # Postings are stored inline
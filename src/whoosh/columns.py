@@ -870,8 +870,10 @@ class CompressedBytesColumn(Column):
             return v
 
         def __iter__(self):
+            decompress = self._decompress
             for v in VarBytesColumn.Reader.__iter__(self):
-                yield self._decompress(v)
+                # Documents without a value have an empty (uncompressed) entry
+                yield decompress(v) if v else v
 
         def load(self):
             return list(self)
@@ -1092,40 +1094,101 @@ class MultiColumnReader(ColumnReader):
     one large column.
     """
 
-    def __init__(self, readers, offsets=None):
+    def __init__(self, readers, offsets=None, doccount=None, default=None,
+                 default_key=None):
         """
         :param readers: a sequence of column reader objects.
+        :param offsets: the document number each reader starts at. If this is
+            not given, the readers are assumed to follow each other.
+        :param doccount: the number of documents in the combined column.
+        :param default: the value to return for documents not covered by any
+            of the readers.
+        :param default_key: the sort key for documents not covered by any of
+            the readers, if it isn't the same as ``default`` (for example
+            because the readers translate their values).
         """
 
         self._readers = readers
-
-        self._doc_offsets = []
-        self._doccount = 0
+        self._lengths = [len(r) for r in readers]
+        self._default = default
+        if default_key is None:
+            default_key = default
+        self._default_key = default_key
 
         if offsets is None:
-            for r in readers:
-                self._doc_offsets.append(self._doccount)
-                self._doccount += len(r)
+            offsets = []
+            base = 0
+            for length in self._lengths:
+                offsets.append(base)
+                base += length
         else:
             assert len(offsets) == len(readers)
-            self._doc_offsets = offsets
+            base = offsets[-1] + self._lengths[-1] if readers else 0
+        self._doc_offsets = offsets
+        self._doccount = base if doccount is None else doccount
+
+    @classmethod
+    def from_sparse(cls, items, doccount, default=None, default_key=None):
+        """Returns a reader combining a sequence of ``(offset, reader)`` pairs
+        that don't have to cover every document. Looking up a document that
+        falls between the readers returns the default value, so callers don't
+        have to pad the gaps with empty readers.
+
+        :param items: a sequence of ``(offset, reader)`` pairs, sorted by
+            offset.
+        :param doccount: the number of documents in the combined column.
+        :param default: the value to return for the missing documents.
+        :param default_key: the sort key for the missing documents, if it
+            isn't the same as ``default``.
+        """
+
+        items = list(items)
+        return cls([r for _, r in items], [offset for offset, _ in items],
+                   doccount, default, default_key)
 
     def _document_reader(self, docnum):
         return max(0, bisect_right(self._doc_offsets, docnum) - 1)
 
     def _reader_and_docnum(self, docnum):
-        rnum = self._document_reader(docnum)
-        offset = self._doc_offsets[rnum]
-        return rnum, docnum - offset
+        # Called for every per-document lookup, so do the search inline
+        # instead of through _document_reader()
+        offsets = self._doc_offsets
+        if len(offsets) < 2:
+            return 0, docnum - offsets[0]
+        rnum = bisect_right(offsets, docnum) - 1
+        if rnum < 0:
+            rnum = 0
+        return rnum, docnum - offsets[rnum]
 
     def __getitem__(self, docnum):
+        if not self._readers:
+            return self._default
         x, y = self._reader_and_docnum(docnum)
+        if y < 0 or y >= self._lengths[x]:
+            # The document is in a gap between the readers
+            return self._default
         return self._readers[x][y]
 
+    def sort_key(self, docnum):
+        if not self._readers:
+            return self._default_key
+        x, y = self._reader_and_docnum(docnum)
+        if y < 0 or y >= self._lengths[x]:
+            return self._default_key
+        return self._readers[x].sort_key(y)
+
     def __iter__(self):
-        for r in self._readers:
+        default = self._default
+        pos = 0
+        for r, offset, length in zip(self._readers, self._doc_offsets,
+                                     self._lengths):
+            for _ in xrange(pos, offset):
+                yield default
             for v in r:
                 yield v
+            pos = offset + length
+        for _ in xrange(pos, self._doccount):
+            yield default
 
 
 class TranslatingColumnReader(ColumnReader):
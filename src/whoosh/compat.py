@@ -27,6 +27,7 @@ if sys.version_info[0] < 3:
     itervalues = lambda o: o.itervalues()
     iterkeys = lambda o: o.iterkeys()
     from itertools import izip
+    from itertools import ifilterfalse as filterfalse
     long_type = long
     next = lambda o: o.next()
     import cPickle as pickle
@@ -74,6 +75,7 @@ else:
     itervalues = lambda o: o.values()
     iterkeys = lambda o: iter(o.keys())
     izip = zip
+    from itertools import filterfalse
     long_type = int
     next = next
     import pickle
@@ -32,7 +32,6 @@ D. J. Bernstein's CDB format (http://cr.yp.to/cdb.html).
 
 import os, struct
 from binascii import crc32
-from bisect import bisect_left
 from hashlib import md5  # @UnresolvedImport
 
 from whoosh.compat import b, bytes_type
@@ -71,6 +70,8 @@ _hash_functions = (md5_hash, crc_hash, cdb_hash)
 
 # Two uints before the key/value pair giving the length of the key and value
 _lengths = struct.Struct("!ii")
+# How many bytes to read at a time when reading through the items in a file
+_READ_CHUNK = 64 * 1024
 # A pointer in a hash table, giving the hash value and the key position
 _pointer = struct.Struct("!Iq")
 # A pointer in the hash table directory, giving the position and number of slots
@@ -336,6 +337,40 @@ class HashReader(object):
             yield (keypos, keylen, datapos, datalen)
             pos = datapos + datalen
 
+    def _items(self, pos=None):
+        # Yields (keybytes, databytes) pairs for the key/value pairs in the
+        # file starting at the given position. The file is read a large chunk
+        # at a time and the items are sliced out of it, instead of doing
+        # separate small reads for the lengths, key, and value of every item
+        dbfile = self.dbfile
+        pos = pos or self.startofdata
+        eod = self.endofdata
+        lenssize = _lengths.size
+        unpacklens = _lengths.unpack_from
+
+        buf = emptybytes
+        # The file position of the start of the buffer
+        bufpos = pos
+        while pos < eod:
+            start = pos - bufpos
+            if start + lenssize > len(buf):
+                buf = dbfile.get(pos, min(_READ_CHUNK, eod - pos))
+                bufpos = pos
+                start = 0
+            keylen, datalen = unpacklens(buf, start)
+            keystart = start + lenssize
+            end = keystart + keylen + datalen
+            if end > len(buf):
+                # The item runs past the end of the buffer
+                size = lenssize + keylen + datalen
+                buf = dbfile.get(pos, max(size, min(_READ_CHUNK, eod - pos)))
+                bufpos = pos
+                keystart = lenssize
+                end = size
+            datastart = keystart + keylen
+            yield buf[keystart:datastart], buf[datastart:end]
+            pos = bufpos + end
+
     def __getitem__(self, key):
         for value in self.all(key):
             return value
@@ -354,19 +389,15 @@ class HashReader(object):
         return False
 
     def keys(self):
-        dbfile = self.dbfile
-        for keypos, keylen, _, _ in self._ranges():
-            yield dbfile.get(keypos, keylen)
+        for key, _ in self._items():
+            yield key
 
     def values(self):
-        dbfile = self.dbfile
-        for _, _, datapos, datalen in self._ranges():
-            yield dbfile.get(datapos, datalen)
+        for _, value in self._items():
+            yield value
 
     def items(self):
-        dbfile = self.dbfile
-        for keypos, keylen, datapos, datalen in self._ranges():
-            yield (dbfile.get(keypos, keylen), dbfile.get(datapos, datalen))
+        return self._items()
 
     def get(self, key, default=None):
         for value in self.all(key):
@@ -501,18 +532,20 @@ class OrderedHashReader(HashReader):
         key.
         """
 
-        dbfile = self.dbfile
-        for keypos, keylen, _, _ in self.ranges_from(key):
-            yield dbfile.get(keypos, keylen)
+        for k, _ in self.items_from(key):
+            yield k
 
     def items_from(self, key):
         """Yields an ordered series of ``(key, value)`` tuples for keys equal
         to or greater than the given key.
         """
 
-        dbfile = self.dbfile
-        for keypos, keylen, datapos, datalen in self.ranges_from(key):
-            yield (dbfile.get(keypos, keylen), dbfile.get(datapos, datalen))
+        pos = self.closest_key_pos(key)
+        if pos is None:
+            return
+
+        for item in self._items(pos):
+            yield item
 
     def _read_extras(self):
         dbfile = self.dbfile
@@ -5,8 +5,10 @@ An implementation of an object that acts like a collection of on/off bits.
 import operator
 from array import array
 from bisect import bisect_left, bisect_right, insort
+from itertools import groupby
 
-from whoosh.compat import integer_types, izip, izip_longest, next, xrange
+from whoosh.compat import array_tobytes, integer_types, izip, izip_longest
+from whoosh.compat import next, xrange
 from whoosh.util.numeric import bytes_for_bits
 
 
@@ -24,6 +26,11 @@ _1SPERBYTE = array('B', [0, 1, 1, 2, 1, 2, 2, 3, 1, 2, 2, 3, 2, 3, 3, 4, 1, 2,
 6, 7, 7, 8])
 
 
+# Whether ints can be converted to and from bytes (Python 3), in which case
+# BitSet can do bitwise logic between whole bit arrays using big integers
+_WORD_LOGIC = hasattr(int, "from_bytes")
+
+
 class DocIdSet(object):
     """Base class for a set of positive integers, implementing a subset of the
     built-in ``set`` type's interface with extra docid-related methods.
@@ -346,6 +353,17 @@ class BitSet(BaseBitSet):
 
     def _logic(self, obj, op, other):
         objbits = obj.bits
+        if _WORD_LOGIC:
+            # Convert both bit arrays to big integers so the operation is done
+            # a machine word at a time in C, instead of a byte at a time in
+            # Python
+            length = max(len(objbits), len(other.bits))
+            x = int.from_bytes(array_tobytes(objbits), "little")
+            y = int.from_bytes(array_tobytes(other.bits), "little")
+            obj.bits = array("B", op(x, y).to_bytes(length, "little"))
+            obj._trim()
+            return obj
+
         for i, (byte1, byte2) in enumerate(izip_longest(objbits, other.bits,
                                                         fillvalue=0)):
             value = op(byte1, byte2) & 0xFF
@@ -388,7 +406,8 @@ class BitSet(BaseBitSet):
 
     def discard(self, i):
         bucket = i >> 3
-        self.bits[bucket] &= ~(1 << (i & 7))
+        if bucket < len(self.bits):
+            self.bits[bucket] &= ~(1 << (i & 7))
 
     def _resize_to_other(self, other):
         if isinstance(other, (list, tuple, set, frozenset)):
@@ -397,6 +416,9 @@ class BitSet(BaseBitSet):
                 self._resize(maxbit)
 
     def update(self, iterable):
+        if isinstance(iterable, BitSet):
+            self._logic(self, operator.__or__, iterable)
+            return
         self._resize_to_other(iterable)
         DocIdSet.update(self, iterable)
 
@@ -451,7 +473,7 @@ class SortedIntSet(DocIdSet):
         self.typecode = typecode
 
     def copy(self):
-        sis = SortedIntSet()
+        sis = SortedIntSet(typecode=self.typecode)
         sis.data = array(self.typecode, self.data)
         return sis
 
@@ -503,7 +525,7 @@ class SortedIntSet(DocIdSet):
     def discard(self, i):
         data = self.data
         pos = bisect_left(data, i)
-        if data[pos] == i:
+        if pos < len(data) and data[pos] == i:
             data.pop(pos)
 
     def clear(self):
@@ -612,6 +634,10 @@ class RoaringIdSet(DocIdSet):
     Separates IDs into ranges of 2^16 bits, and stores each range in the most
     efficient type of doc set, either a BitSet (if the range has >= 2^12 IDs)
     or a sorted ID set of 16-bit shorts.
+
+    Unlike a :class:`BitSet`, the memory used by this set is proportional to
+    the number of IDs it contains rather than to the highest ID, so it is a
+    good choice for sparse sets of document numbers in large indexes.
     """
 
     cutoff = 2**12
@@ -621,12 +647,20 @@ class RoaringIdSet(DocIdSet):
         if source:
             self.update(source)
 
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, list(self))
+
     def __len__(self):
         if not self.idsets:
             return 0
 
         return sum(len(idset) for idset in self.idsets)
 
+    def __nonzero__(self):
+        return any(self.idsets)
+
+    __bool__ = __nonzero__
+
     def __contains__(self, n):
         bucket = n >> 16
         if bucket >= len(self.idsets):
@@ -634,19 +668,41 @@ class RoaringIdSet(DocIdSet):
         return (n - (bucket << 16)) in self.idsets[bucket]
 
     def __iter__(self):
-        for i, idset in self.idsets:
+        for i, idset in enumerate(self.idsets):
             floor = i << 16
             for n in idset:
                 yield floor + n
 
+    def _container(self, bucket):
+        idsets = self.idsets
+        if bucket >= len(idsets):
+            idsets.extend([SortedIntSet(typecode="H") for _
+                           in xrange(len(idsets), bucket + 1)])
+        return idsets[bucket]
+
     def _find(self, n):
         bucket = n >> 16
-        floor = n << 16
-        if bucket >= len(self.idsets):
-            self.idsets.extend([SortedIntSet() for _
-                                in xrange(len(self.idsets), bucket + 1)])
+        floor = bucket << 16
+        return bucket, floor, self._container(bucket)
+
+    def _optimize(self, bucket):
+        # Switch the container for the given bucket to the most efficient type
+        # for the number of IDs it currently holds
         idset = self.idsets[bucket]
-        return bucket, floor, idset
+        size = len(idset)
+        if isinstance(idset, SortedIntSet):
+            if size > ROARING_CUTOFF:
+                self.idsets[bucket] = BitSet(idset)
+        elif size <= ROARING_CUTOFF:
+            self.idsets[bucket] = SortedIntSet(idset, typecode="H")
+
+    def copy(self):
+        rs = self.__class__()
+        rs.idsets = [idset.copy() for idset in self.idsets]
+        return rs
+
+    def clear(self):
+        self.idsets = []
 
     def add(self, n):
         bucket, floor, idset = self._find(n)
@@ -656,11 +712,83 @@ class RoaringIdSet(DocIdSet):
             self.idsets[bucket] = BitSet(idset)
 
     def discard(self, n):
-        bucket, floor, idset = self._find(n)
+        bucket = n >> 16
+        if bucket >= len(self.idsets):
+            return
+        floor = bucket << 16
+        idset = self.idsets[bucket]
         oldlen = len(idset)
         idset.discard(n - floor)
         if oldlen > ROARING_CUTOFF >= len(idset):
-            self.idsets[bucket] = SortedIntSet(idset)
+            self.idsets[bucket] = SortedIntSet(idset, typecode="H")
+
+    def update(self, other):
+        # Group runs of IDs that fall in the same range (in a sorted source
+        # such as a posting list, this is every ID in the range) and add each
+        # run to its container in one go, instead of calling add() per ID
+        for bucket, group in groupby(other, lambda n: n >> 16):
+            floor = bucket << 16
+            lows = [n - floor for n in group]
+            idset = self._container(bucket)
+            if (isinstance(idset, SortedIntSet)
+                    and len(idset) + len(lows) > ROARING_CUTOFF):
+                idset = self.idsets[bucket] = BitSet(idset)
+            idset.update(lows)
+
+    def _logic_update(self, other, method):
+        # Applies the given in-place method to pairs of containers covering
+        # the same range in this set and another RoaringIdSet
+        idsets = self.idsets
+        otherids = other.idsets
+        for bucket in xrange(len(idsets)):
+            if bucket < len(otherids):
+                getattr(idsets[bucket], method)(otherids[bucket])
+                self._optimize(bucket)
+            elif method == "intersection_update":
+                idsets[bucket] = SortedIntSet(typecode="H")
+
+    def intersection_update(self, other):
+        if isinstance(other, RoaringIdSet):
+            return self._logic_update(other, "intersection_update")
+        keep = [n for n in self if n in other]
+        self.clear()
+        self.update(keep)
+
+    def difference_update(self, other):
+        if isinstance(other, RoaringIdSet):
+            return self._logic_update(other, "difference_update")
+        DocIdSet.difference_update(self, other)
+
+    def first(self):
+        return self.after(-1)
+
+    def last(self):
+        return self.before(len(self.idsets) << 16)
+
+    def before(self, i):
+        idsets = self.idsets
+        if i <= 0 or not idsets:
+            return None
+
+        bucket = min((i - 1) >> 16, len(idsets) - 1)
+        while bucket >= 0:
+            floor = bucket << 16
+            n = idsets[bucket].before(i - floor)
+            if n is not None:
+                return floor + n
+            bucket -= 1
+        return None
+
+    def after(self, i):
+        idsets = self.idsets
+        bucket = max(i, 0) >> 16
+        while bucket < len(idsets):
+            floor = bucket << 16
+            n = idsets[bucket].after(i - floor)
+            if n is not None:
+                return floor + n
+            bucket += 1
+        return None
 
 
 class MultiIdSet(DocIdSet):
@@ -577,9 +577,10 @@ class AndNotMatcher(BiMatcher):
         self._find_first()
 
     def _find_first(self):
-        if (self.a.is_active()
-            and self.b.is_active()
-            and self.a.id() == self.b.id()):
+        # _find_next() skips the negative matcher up to the positive one
+        # before comparing them, so it also handles a negative matcher that
+        # starts on a lower document
+        if self.a.is_active() and self.b.is_active():
             self._find_next()
 
     def is_active(self):
@@ -588,7 +589,7 @@ class AndNotMatcher(BiMatcher):
     def _find_next(self):
         pos = self.a
         neg = self.b
-        if not neg.is_active():
+        if not pos.is_active() or not neg.is_active():
             return
         pos_id = pos.id()
         r = False
@@ -647,6 +648,28 @@ class AndNotMatcher(BiMatcher):
     def id(self):
         return self.a.id()
 
+    def all_ids(self):
+        # Stream the positive IDs and only skip the negative matcher forward
+        # to each one, instead of going through next()/_find_next() for
+        # every posting
+        pos = self.a
+        neg = self.b
+        if not pos.is_active():
+            return
+        # _find_first() may have moved the positive matcher past some IDs
+        # that were excluded, which the positive matcher's all_ids() might
+        # yield again
+        start = pos.id()
+        neg_id = neg.id() if neg.is_active() else None
+        for docid in pos.all_ids():
+            if docid < start:
+                continue
+            if neg_id is not None and neg_id < docid:
+                neg.skip_to(docid)
+                neg_id = neg.id() if neg.is_active() else None
+            if docid != neg_id:
+                yield docid
+
     def next(self):
         if not self.a.is_active():
             raise mcore.ReadTooFar
@@ -237,6 +237,23 @@ class Matcher(object):
                 m = m.replace()
                 i = 0
 
+    def all_postings(self):
+        """Returns a generator of all (ID, weight, encoded value) tuples in
+        the matcher.
+
+        What this method returns for a matcher that has already read some
+        postings (whether it only yields the remaining postings or all postings
+        from the beginning) is undefined, so it's best to only use this method
+        on fresh matchers.
+        """
+
+        # Look up the methods once instead of on every posting
+        is_active, id_, weight = self.is_active, self.id, self.weight
+        value, next_ = self.value, self.next
+        while is_active():
+            yield (id_(), weight(), value())
+            next_()
+
     def items_as(self, astype):
         """Returns a generator of all (ID, decoded value) pairs in the matcher.
 
@@ -246,9 +263,11 @@ class Matcher(object):
         on fresh matchers.
         """
 
-        while self.is_active():
-            yield (self.id(), self.value_as(astype))
-            self.next()
+        is_active, id_, value_as, next_ = (self.is_active, self.id,
+                                           self.value_as, self.next)
+        while is_active():
+            yield (id_(), value_as(astype))
+            next_()
 
     @abstractmethod
     def value(self):
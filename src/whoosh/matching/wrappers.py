@@ -222,9 +222,18 @@ class MultiMatcher(mcore.Matcher):
 
         matchers = self.matchers
         offsets = self.offsets
+        last = len(matchers) - 1
         r = False
 
         while self.current < len(matchers) and id > self.id():
+            if self.current < last and id >= offsets[self.current + 1]:
+                # The target is past all of this sub-matcher's documents, so
+                # move on to the next one without skipping through its
+                # postings
+                self.current += 1
+                self._next_matcher()
+                continue
+
             mr = matchers[self.current]
             sr = mr.skip_to(id - offsets[self.current])
             r = sr or r
@@ -329,6 +338,18 @@ class FilterMatcher(WrappingMatcher):
         else:
             return (item for item in self.child.all_items() if item[0] in ids)
 
+    def all_postings(self):
+        ids = self._ids
+        boost = self.boost
+        postings = self.child.all_postings()
+        if boost != 1.0:
+            postings = ((id, weight * boost, value)
+                        for id, weight, value in postings)
+        if self._exclude:
+            return (p for p in postings if p[0] not in ids)
+        else:
+            return (p for p in postings if p[0] in ids)
+
 
 class InverseMatcher(WrappingMatcher):
     """Synthetic matcher, generates postings that are NOT present in the
@@ -363,6 +384,14 @@ class InverseMatcher(WrappingMatcher):
     def supports_block_quality(self):
         return False
 
+    # Every generated posting gets the same score, which has nothing to do
+    # with the wrapped matcher's quality
+    def max_quality(self):
+        return self._weight
+
+    def block_quality(self):
+        return self._weight
+
     def _find_next(self):
         child = self.child
         missing = self.missing
@@ -398,6 +427,11 @@ class InverseMatcher(WrappingMatcher):
         return self._id
 
     def all_ids(self):
+        if not self.child.is_active():
+            # Nothing to exclude except the missing documents, so just count
+            missing = self.missing
+            return (id for id in xrange(self._id, self.limit)
+                    if not missing(id))
         return mcore.Matcher.all_ids(self)
 
     def next(self):
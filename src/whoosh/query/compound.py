@@ -26,6 +26,7 @@
 # policies, either expressed or implied, of Matt Chaput.
 
 from __future__ import division
+import weakref
 
 from whoosh import matching
 from whoosh.compat import text_type, u
@@ -37,8 +38,19 @@ from whoosh.util import make_binary_tree, make_weighted_tree
 class CompoundQuery(qcore.Query):
     """Abstract base class for queries that combine or manipulate the results
     of multiple sub-queries .
+
+    The results of :meth:`~CompoundQuery.normalize` and
+    :meth:`~CompoundQuery.simplify` are cached on the instance, so query
+    objects should be treated as immutable once they've been normalized or
+    simplified. Use :meth:`~whoosh.query.Query.copy` (or
+    :meth:`~whoosh.query.Query.with_boost`) to get a modifiable copy.
     """
 
+    # Cached results of normalize() and simplify(). The simplify cache is a
+    # (weakref to reader, query) pair
+    _norm_cache = None
+    _simp_cache = None
+
     def __init__(self, subqueries, boost=1.0):
         for subq in subqueries:
             if not isinstance(subq, qcore.Query):
@@ -54,10 +66,8 @@ class CompoundQuery(qcore.Query):
         return r
 
     def __unicode__(self):
-        r = u("(")
-        r += self.JOINT.join([text_type(s) for s in self.subqueries])
-        r += u(")")
-        return r
+        return u("(%s)") % self.JOINT.join([text_type(s) for s
+                                            in self.subqueries])
 
     __str__ = __unicode__
 
@@ -77,10 +87,8 @@ class CompoundQuery(qcore.Query):
         return iter(self.subqueries)
 
     def __hash__(self):
-        h = hash(self.__class__.__name__) ^ hash(self.boost)
-        for q in self.subqueries:
-            h ^= hash(q)
-        return h
+        return hash((self.__class__.__name__, tuple(self.subqueries),
+                     self.boost))
 
     def is_leaf(self):
         return False
@@ -118,20 +126,39 @@ class CompoundQuery(qcore.Query):
         return 0
 
     def normalize(self):
+        norm = self._norm_cache
+        if norm is None:
+            norm = self._normalize()
+            self._norm_cache = norm
+            # The normalized form is its own normal form
+            if isinstance(norm, CompoundQuery):
+                norm._norm_cache = norm
+        return norm
+
+    def _normalize(self):
         from whoosh.query import Every, TermRange, NumericRange
 
-        # Normalize subqueries and merge nested instances of this class
+        # Normalize subqueries, dropping NullQuerys and merging nested
+        # instances of this class
+        cls = self.__class__
+        nullq = qcore.NullQuery
         subqueries = []
         for s in self.subqueries:
             s = s.normalize()
-            if isinstance(s, self.__class__):
-                subqueries += [ss.with_boost(ss.boost * s.boost) for ss in s]
+            if s is nullq:
+                continue
+            if isinstance(s, cls):
+                if s.boost == 1.0:
+                    subqueries.extend(s.subqueries)
+                else:
+                    subqueries.extend(ss.with_boost(ss.boost * s.boost)
+                                      for ss in s)
             else:
                 subqueries.append(s)
 
         # If every subquery is Null, this query is Null
-        if all(q is qcore.NullQuery for q in subqueries):
-            return qcore.NullQuery
+        if not subqueries:
+            return nullq
 
         # If there's an unfielded Every inside, then this query is Every
         if any((isinstance(q, Every) and q.fieldname is None)
@@ -162,22 +189,23 @@ class CompoundQuery(qcore.Query):
                 everyfields.add(q.fieldname)
             i += 1
 
-        # Eliminate duplicate queries
+        # Eliminate duplicate queries (and any NullQuery left by merging
+        # ranges)
         subqs = []
         seenqs = set()
         for s in subqueries:
-            if not isinstance(s, Every) and s.field() in everyfields:
+            if s is nullq:
+                continue
+            if (everyfields and not isinstance(s, Every)
+                and s.field() in everyfields):
                 continue
             if s in seenqs:
                 continue
             seenqs.add(s)
             subqs.append(s)
 
-        # Remove NullQuerys
-        subqs = [q for q in subqs if q is not qcore.NullQuery]
-
         if not subqs:
-            return qcore.NullQuery
+            return nullq
 
         if len(subqs) == 1:
             sub = subqs[0]
@@ -186,15 +214,25 @@ class CompoundQuery(qcore.Query):
                 sub = sub.with_boost(sub_boost * self.boost)
             return sub
 
-        return self.__class__(subqs, boost=self.boost)
+        return cls(subqs, boost=self.boost)
 
     def simplify(self, ixreader):
+        # Some readers (e.g. the memory codec's) see documents added after
+        # they were opened, so the cached result also records the reader's
+        # document count
+        doccount = ixreader.doc_count_all()
+        cache = self._simp_cache
+        if (cache is not None and cache[0]() is ixreader
+                and cache[1] == doccount):
+            return cache[2]
+
         subs = self.subqueries
         if subs:
             q = self.__class__([subq.simplify(ixreader) for subq in subs],
                                 boost=self.boost).normalize()
         else:
             q = qcore.NullQuery
+        self._simp_cache = (weakref.ref(ixreader), doccount, q)
         return q
 
     def matcher(self, searcher, context=None):
@@ -254,6 +292,14 @@ class And(CompoundQuery):
     JOINT = " AND "
     intersect_merge = True
 
+    # When scores don't matter, the smallest subquery is estimated to match
+    # fewer than this many documents, and the largest subquery is at least
+    # BITMAP_RATIO times bigger, load the smallest subquery's matches into a
+    # set and filter it with the other subqueries instead of building a tree
+    # of intersection matchers
+    BITMAP_LIMIT = 50000
+    BITMAP_RATIO = 10
+
     def requires(self):
         s = set()
         for q in self.subqueries:
@@ -264,10 +310,84 @@ class And(CompoundQuery):
         return min(q.estimate_size(ixreader) for q in self.subqueries)
 
     def _matcher(self, subs, searcher, context):
+        from whoosh.query import Not
+
+        # Pull out the Not subqueries. Intersecting with a Not would walk an
+        # InverseMatcher over every document in the index, whether the
+        # excluded set is tiny or covers most of the index. Instead, exclude
+        # them with a single AndNotMatcher, which only skips the negative
+        # matcher forward to the documents the positive side produces
+        nots = [q.query for q in subs if isinstance(q, Not)]
+        if nots and len(nots) < len(subs):
+            subs = [q for q in subs if not isinstance(q, Not)]
+        else:
+            nots = None
+
+        r = searcher.reader()
+        needs_current = context.needs_current if context else True
+        m = None
+        if (not needs_current and context.weighting is None
+                and len(subs) > 1):
+            m = self._filter_matcher(subs, searcher, context)
+        if m is None:
+            q_weight_fn = lambda q: 0 - q.estimate_size(r)
+            m = self._tree_matcher(subs, matching.IntersectionMatcher,
+                                   searcher, context, q_weight_fn)
+
+        if nots:
+            if len(nots) == 1:
+                notq = nots[0]
+            else:
+                notq = Or(nots)
+            notm = notq.matcher(searcher, searcher.boolean_context())
+            if notm.is_active():
+                m = matching.AndNotMatcher(m, notm)
+        return m
+
+    def _filter_matcher(self, subs, searcher, context):
+        # Returns a ListMatcher of the intersected document numbers, or None
+        # if the sizes of the subqueries don't suit this strategy
+
         r = searcher.reader()
-        q_weight_fn = lambda q: 0 - q.estimate_size(r)
-        return self._tree_matcher(subs, matching.IntersectionMatcher, searcher,
-                                  context, q_weight_fn)
+        sized = sorted(((q.estimate_size(r), i, q) for i, q
+                        in enumerate(subs)), key=lambda x: (x[0], x[1]))
+        smallest = sized[0][0]
+        if (smallest >= self.BITMAP_LIMIT
+                or sized[-1][0] <= smallest * self.BITMAP_RATIO):
+            return None
+
+        ms = [q.matcher(searcher, context) for _, _, q in sized]
+        if not all(m.is_active() for m in ms):
+            return matching.NullMatcher()
+
+        # Materialize the smallest set of matches and filter it through the
+        # other matchers in order of size
+        ids = list(ms[0].all_ids())
+        for (size, _, _), m in zip(sized[1:], ms[1:]):
+            if not ids:
+                break
+            if size <= len(ids) * self.BITMAP_RATIO:
+                # Comparable sizes: read the postings straight through and
+                # keep the ones in the set, which avoids the per-document
+                # back-and-forth of skipping two matchers against each other
+                docset = set(ids)
+                ids = [docid for docid in m.all_ids() if docid in docset]
+            else:
+                # Much bigger: only probe the matcher at the surviving
+                # document numbers, which lets it skip whole blocks
+                keep = []
+                for docid in ids:
+                    if m.id() < docid:
+                        m.skip_to(docid)
+                        if not m.is_active():
+                            break
+                    if m.id() == docid:
+                        keep.append(docid)
+                ids = keep
+
+        if not ids:
+            return matching.NullMatcher()
+        return matching.ListMatcher(ids, all_weights=self.boost)
 
 
 class Or(CompoundQuery):
@@ -310,9 +430,8 @@ class Or(CompoundQuery):
         self.scale = scale
 
     def __unicode__(self):
-        r = u("(")
-        r += (self.JOINT).join([text_type(s) for s in self.subqueries])
-        r += u(")")
+        r = u("(%s)") % self.JOINT.join([text_type(s) for s
+                                         in self.subqueries])
         if self.minmatch:
             r += u(">%s") % self.minmatch
         return r
@@ -508,11 +627,15 @@ class BinaryQuery(CompoundQuery):
         self.subqueries = (a, b)
 
     def __eq__(self, other):
-        return (other and self.__class__ is other.__class__
+        if other is self:
+            return True
+        return (self.__class__ is other.__class__
                 and self.a == other.a and self.b == other.b)
 
     def __hash__(self):
-        return (hash(self.__class__.__name__) ^ hash(self.a) ^ hash(self.b))
+        # Hash a tuple instead of XORing, so "a ANDNOT b" and "b ANDNOT a"
+        # (or "a ANDNOT a" and "b ANDNOT b") don't collide
+        return hash((self.__class__.__name__, self.a, self.b))
 
     def needs_spans(self):
         return self.a.needs_spans() or self.b.needs_spans()
@@ -571,8 +694,18 @@ class AndNot(BinaryQuery):
         return self.a.requires()
 
     def matcher(self, searcher, context=None):
+        if _matches_all(self.b):
+            # Everything is excluded
+            return matching.NullMatcher()
+
         scoredm = self.a.matcher(searcher, context)
+        if not scoredm.is_active():
+            return scoredm
         notm = self.b.matcher(searcher, searcher.boolean_context())
+        if not notm.is_active():
+            # Nothing to exclude, so don't pay for the wrapper on every
+            # posting
+            return scoredm
         return matching.AndNotMatcher(scoredm, notm)
 
 
@@ -623,6 +756,11 @@ class Require(BinaryQuery):
 
     def matcher(self, searcher, context=None):
         scoredm = self.a.matcher(searcher, context)
+        if _matches_all(self.b):
+            # Requiring every document doesn't filter anything (the postings
+            # already leave out deleted documents), so don't walk the
+            # required side in step with the scored side
+            return scoredm
         requiredm = self.b.matcher(searcher, searcher.boolean_context())
         return matching.RequireMatcher(scoredm, requiredm)
 
@@ -655,6 +793,23 @@ class AndMaybe(BinaryQuery):
         return self.subqueries[0].docs(searcher)
 
 
+def _matches_all(q):
+    # True if the query is an unfielded Every, which matches every undeleted
+    # document
+    return isinstance(q, qcore.Every) and q.fieldname in (None, "", "*")
+
+
 def BooleanQuery(required, should, prohibited):
-    return AndNot(AndMaybe(And(required), Or(should)),
-                  Or(prohibited)).normalize()
+    if not required:
+        # Without required clauses the AndMaybe normalizes to nothing
+        return qcore.NullQuery
+
+    # Only wrap in the optional and prohibited parts when there are any, so
+    # the common case doesn't build empty Or queries just to normalize them
+    # away again
+    q = And(required)
+    if should:
+        q = AndMaybe(q, Or(should))
+    if prohibited:
+        q = AndNot(q, Or(prohibited))
+    return q.normalize()
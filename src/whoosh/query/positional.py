@@ -27,6 +27,7 @@
 
 from __future__ import division
 import copy
+import weakref
 
 from whoosh import matching
 from whoosh.analysis import Token
@@ -121,6 +122,10 @@ class Ordered(Sequence):
 class Phrase(qcore.Query):
     """Matches documents containing a given phrase."""
 
+    # Cached (weakref to reader, doc count, fieldname, words, stats) tuple,
+    # see _term_stats()
+    _stats_cache = None
+
     def __init__(self, fieldname, words, slop=1, boost=1.0, char_ranges=None):
         """
         :param fieldname: the field to search.
@@ -141,7 +146,9 @@ class Phrase(qcore.Query):
         self.char_ranges = char_ranges
 
     def __eq__(self, other):
-        return (other and self.__class__ is other.__class__
+        if other is self:
+            return True
+        return (self.__class__ is other.__class__
                 and self.fieldname == other.fieldname
                 and self.words == other.words
                 and self.slop == other.slop
@@ -158,10 +165,10 @@ class Phrase(qcore.Query):
     __str__ = __unicode__
 
     def __hash__(self):
-        h = hash(self.fieldname) ^ hash(self.slop) ^ hash(self.boost)
-        for w in self.words:
-            h ^= hash(w)
-        return h
+        # XORing the word hashes would give the same hash to phrases with
+        # the same words in a different order, and cancel out repeated words
+        return hash((self.fieldname, tuple(self.words), self.slop,
+                     self.boost))
 
     def has_terms(self):
         return True
@@ -191,6 +198,10 @@ class Phrase(qcore.Query):
                 t.startchar, t.endchar = self.char_ranges[0]
             return t
 
+        if None not in self.words:
+            # Nothing to remove, so this query is already normalized
+            return self
+
         words = [w for w in self.words if w is not None]
         return self.__class__(self.fieldname, words, slop=self.slop,
                               boost=self.boost, char_ranges=self.char_ranges)
@@ -198,51 +209,108 @@ class Phrase(qcore.Query):
     def replace(self, fieldname, oldtext, newtext):
         q = copy.copy(self)
         if q.fieldname == fieldname:
+            # Don't change the original query's list of words
+            q.words = list(q.words)
             for i, word in enumerate(q.words):
                 if word == oldtext:
                     q.words[i] = newtext
         return q
 
-    def _and_query(self):
-        return compound.And([terms.Term(self.fieldname, word)
-                             for word in self.words])
+    def _term_stats(self, ixreader):
+        # Returns a list of the encoded words (None if a word can't be
+        # encoded) and a list of their document frequencies. Query planning
+        # calls estimate_size() and then matcher() on the same reader, so the
+        # result is cached along with the words it was computed from. Some
+        # readers (e.g. the memory codec's) see documents added after they
+        # were opened, so the reader's document count is kept too
+        fieldname = self.fieldname
+        words = tuple(self.words)
+        doccount = ixreader.doc_count_all()
+        cache = self._stats_cache
+        if (cache is not None and cache[0]() is ixreader
+                and cache[1] == doccount and cache[2] == fieldname
+                and cache[3] == words):
+            return cache[4]
+
+        btexts = []
+        dfs = []
+        try:
+            field = ixreader.schema[fieldname]
+        except KeyError:
+            field = None
+        if field is not None:
+            # Look up each distinct word only once, even if it's repeated in
+            # the phrase
+            seen = {}
+            for word in words:
+                try:
+                    btext = field.to_bytes(word)
+                except ValueError:
+                    btexts.append(None)
+                    dfs.append(0)
+                    continue
+
+                df = seen.get(btext)
+                if df is None:
+                    df = seen[btext] = ixreader.doc_frequency(fieldname,
+                                                              btext)
+                btexts.append(btext)
+                dfs.append(df)
+        else:
+            btexts = [None] * len(words)
+            dfs = [0] * len(words)
+
+        stats = (btexts, dfs)
+        self._stats_cache = (weakref.ref(ixreader), doccount, fieldname,
+                             words, stats)
+        return stats
 
     def estimate_size(self, ixreader):
-        return self._and_query().estimate_size(ixreader)
+        # Every document containing the phrase contains all of its words, so
+        # the rarest word's document frequency is an upper bound
+        return min(self._term_stats(ixreader)[1] or [0])
 
     def estimate_min_size(self, ixreader):
-        return self._and_query().estimate_min_size(ixreader)
+        dfs = self._term_stats(ixreader)[1]
+        return min([df for df in dfs if df] or [0])
 
     def matcher(self, searcher, context=None):
-        from whoosh.query import Term, SpanNear2
+        from whoosh.query import SpanNear2
 
         fieldname = self.fieldname
-        if fieldname not in searcher.schema:
+        try:
+            field = searcher.schema[fieldname]
+        except KeyError:
             return matching.NullMatcher()
 
-        field = searcher.schema[fieldname]
         if not field.format or not field.format.supports("positions"):
             raise qcore.QueryError("Phrase search: %r field has no positions"
                                    % self.fieldname)
 
-        terms = []
-        # Build a list of Term queries from the words in the phrase
-        reader = searcher.reader()
-        for word in self.words:
-            try:
-                word = field.to_bytes(word)
-            except ValueError:
-                return matching.NullMatcher()
-
-            if (fieldname, word) not in reader:
-                # Shortcut the query if one of the words doesn't exist.
-                return matching.NullMatcher()
-            terms.append(Term(fieldname, word))
-
-        # Create the equivalent SpanNear2 query from the terms
-        q = SpanNear2(terms, slop=self.slop, ordered=True, mindist=1)
-        # Get the matcher
-        m = q.matcher(searcher, context)
+        btexts, dfs = self._term_stats(searcher.reader())
+        if not all(dfs):
+            # Shortcut the query if one of the words doesn't exist.
+            return matching.NullMatcher()
+
+        # Get the postings directly instead of going through Term.matcher(),
+        # which would check again that each word exists
+        if context is None:
+            w = searcher.weighting
+        else:
+            w = context.weighting
+        ms = [searcher.postings(fieldname, btext, weighting=w)
+              for btext in btexts]
+
+        # Build the equivalent SpanNear2 matcher from the postings. The
+        # document frequencies are used to shape the intersection tree so the
+        # two rarest words are intersected first, while the spans are still
+        # checked in phrase order. Two-word phrases (the most common kind)
+        # use a matcher specialized for a single pair of position lists
+        if len(ms) == 2:
+            cls = SpanNear2.TermPairMatcher
+        else:
+            cls = SpanNear2.SpanNear2Matcher
+        m = cls(ms, slop=self.slop, ordered=True, mindist=1, weights=dfs)
 
         if self.boost != 1.0:
             m = matching.WrappingMatcher(m, boost=self.boost)
@@ -27,7 +27,6 @@
 
 from __future__ import division
 import copy
-from array import array
 
 from whoosh import matching
 from whoosh.compat import u
@@ -202,6 +201,18 @@ class Query(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __getstate__(self):
+        # Don't carry cached normalize()/simplify() results, hashes or
+        # strings over to copies, since a copy may be modified (e.g. by
+        # with_boost() or replace()) after it's made
+        d = self.__dict__.copy()
+        d.pop("_norm_cache", None)
+        d.pop("_simp_cache", None)
+        d.pop("_stats_cache", None)
+        d.pop("_hash", None)
+        d.pop("_ustr", None)
+        return d
+
     def is_leaf(self):
         """Returns True if this is a leaf node in the query tree, or False if
         this query has sub-queries.
@@ -283,7 +294,12 @@ class Query(object):
         """
 
         def fn_wrapper(q):
-            q = q.apply(fn_wrapper)
+            if q.is_leaf():
+                # apply() returns leaves as-is, so make a (shallow) copy
+                q = copy.copy(q)
+            else:
+                # apply() builds a new node around the new children
+                q = q.apply(fn_wrapper)
             return fn(q)
 
         return fn_wrapper(self)
@@ -347,7 +363,15 @@ class Query(object):
         """
 
         schema = ixreader.schema
-        termset = set()
+        # Encoded terms to look up in the reader
+        candidates = set()
+        # Terms that have already been converted, so a term that appears
+        # more than once in the tree is only converted and checked once
+        seen = set()
+        # Bind the methods used in the inner loop, which can run over
+        # thousands of expanded terms
+        add_candidate = candidates.add
+        add_seen = seen.add
 
         for q in self.leaves():
             if fieldname and fieldname != q.field():
@@ -358,21 +382,24 @@ class Query(object):
             else:
                 terms = q.terms(phrases=phrases)
 
-            for fieldname, text in terms:
-                if (fieldname, text) in termset:
+            for term in terms:
+                if term in seen:
                     continue
+                add_seen(term)
 
-                if fieldname in schema:
-                    field = schema[fieldname]
+                tfieldname, text = term
+                try:
+                    btext = schema[tfieldname].to_bytes(text)
+                except (KeyError, ValueError):
+                    continue
 
-                    try:
-                        btext = field.to_bytes(text)
-                    except ValueError:
-                        continue
+                add_candidate((tfieldname, btext))
 
-                    if (fieldname, btext) in ixreader:
-                        termset.add((fieldname, btext))
-        return termset
+        # Check the terms from the whole tree in one pass, in term index
+        # order, so the lookups move through the index sequentially instead
+        # of jumping around in the order the words appear in phrases
+        contains = ixreader.__contains__
+        return set(bterm for bterm in sorted(candidates) if contains(bterm))
 
     def leaves(self):
         """Returns an iterator of all the leaf queries in this query tree as a
@@ -586,10 +613,11 @@ class _NullQuery(Query):
         return "<%s>" % (self.__class__.__name__)
 
     def __eq__(self, other):
-        return isinstance(other, _NullQuery)
+        # Almost every comparison is against the NullQuery singleton itself
+        return other is self or isinstance(other, _NullQuery)
 
     def __ne__(self, other):
-        return not self.__eq__(other)
+        return not (other is self or isinstance(other, _NullQuery))
 
     def __hash__(self):
         return id(self)
@@ -700,8 +728,14 @@ class Every(Query):
         reader = searcher.reader()
 
         if fieldname in (None, "", "*"):
-            # This takes into account deletions
-            doclist = array("I", reader.all_doc_ids())
+            # Generate the document numbers on the fly (skipping deleted
+            # documents) instead of loading them all into an array. When
+            # this is combined with a more selective query, the matcher is
+            # only skipped to that query's documents
+            missing = reader.is_deleted if reader.has_deletions() else None
+            return matching.InverseMatcher(matching.NullMatcher(),
+                                           reader.doc_count_all(),
+                                           missing=missing, weight=self.boost)
         else:
             # This is a hacky hack, but just create an in-memory set of all the
             # document numbers of every term in the field. This is SLOOOW for
@@ -26,6 +26,7 @@
 # policies, either expressed or implied, of Matt Chaput.
 
 from __future__ import division
+from itertools import chain
 
 from whoosh.compat import b, u
 from whoosh.query import qcore, terms, compound, wrappers
@@ -205,16 +206,30 @@ class TermRange(RangeMixin, terms.MultiTerm):
             except ValueError:
                 return
 
-        for fname, t in ixreader.terms_from(fieldname, start):
-            if fname != fieldname:
-                break
-            if t == start and startexcl:
-                continue
-            if t == end and endexcl:
-                break
-            if t > end:
-                break
-            yield t
+        # terms_from() seeks straight to the start of the range, so this only
+        # reads the terms inside the range (plus the one after it)
+        termiter = iter(ixreader.terms_from(fieldname, start))
+        if startexcl:
+            # Only the first term can be equal to the start, so deal with it
+            # here instead of testing every term in the loop
+            first = next(termiter, None)
+            if first is None:
+                return
+            if first != (fieldname, start):
+                termiter = chain([first], termiter)
+
+        # Use a separate loop for each kind of end bound, so each term only
+        # needs two comparisons
+        if endexcl:
+            for fname, t in termiter:
+                if fname != fieldname or t >= end:
+                    break
+                yield t
+        else:
+            for fname, t in termiter:
+                if fname != fieldname or t > end:
+                    break
+                yield t
 
 
 class NumericRange(RangeMixin, qcore.Query):
@@ -43,9 +43,12 @@ For example, to find documents containing "whoosh" at most 5 positions before
 
 """
 
+from bisect import bisect_left, bisect_right
+
+from whoosh.compat import xrange
 from whoosh.matching import mcore, wrappers, binary
 from whoosh.query import Query, And, AndMaybe, Or, Term
-from whoosh.util import make_binary_tree
+from whoosh.util import make_binary_tree, make_weighted_tree
 
 
 # Span class
@@ -573,22 +576,40 @@ class SpanNear2(SpanQuery):
                               ordered=self.ordered, mindist=self.mindist)
 
     def matcher(self, searcher, context=None):
+        r = searcher.reader()
         ms = [q.matcher(searcher, context) for q in self.qs]
+        weights = [q.estimate_size(r) for q in self.qs]
         return self.SpanNear2Matcher(ms, slop=self.slop, ordered=self.ordered,
-                                     mindist=self.mindist)
+                                     mindist=self.mindist, weights=weights)
 
     class SpanNear2Matcher(SpanWrappingMatcher):
-        def __init__(self, ms, slop=1, ordered=True, mindist=1):
+        def __init__(self, ms, slop=1, ordered=True, mindist=1, weights=None):
+            """
+            :param ms: the sub-matchers, in the order their spans must occur.
+            :param weights: an optional list of sizes for the sub-matchers,
+                such as document frequencies. If given, the intersection tree
+                is built Huffman-style, so the two smallest posting lists are
+                intersected innermost and the biggest lists are only skipped
+                to the few documents they produce. The spans are still
+                checked in the order of ``ms``.
+            """
+
             self.ms = ms
             self.slop = slop
             self.ordered = ordered
             self.mindist = mindist
-            isect = make_binary_tree(binary.IntersectionMatcher, ms)
+            self.weights = weights
+            if weights is None:
+                isect = make_binary_tree(binary.IntersectionMatcher, ms)
+            else:
+                isect = make_weighted_tree(binary.IntersectionMatcher,
+                                           list(zip(weights, ms)))
             super(SpanNear2.SpanNear2Matcher, self).__init__(isect)
 
         def copy(self):
             return self.__class__([m.copy() for m in self.ms], slop=self.slop,
-                                  ordered=self.ordered, mindist=self.mindist)
+                                  ordered=self.ordered, mindist=self.mindist,
+                                  weights=self.weights)
 
         def replace(self, minquality=0):
             # TODO: fix this
@@ -602,6 +623,9 @@ class SpanNear2(SpanQuery):
             ordered = self.ordered
             ms = self.ms
 
+            if ordered and mindist > 0:
+                return self._get_ordered_spans()
+
             aspans = ms[0].spans()
             i = 1
             while i < len(ms) and aspans:
@@ -643,6 +667,77 @@ class SpanNear2(SpanQuery):
             else:
                 return []
 
+        def _get_ordered_spans(self):
+            # When the spans must be in order and can't overlap (as in a
+            # phrase), B matches A if and only if
+            # A.end + mindist <= B.start <= A.end + slop, so the matching
+            # B spans can be found with two binary searches on the B start
+            # positions instead of testing the distance to each B span
+            slop = self.slop
+            mindist = self.mindist
+
+            aspans = self.ms[0].spans()
+            for m in self.ms[1:]:
+                if not aspans:
+                    return []
+                bspans = m.spans()
+                bstarts = [bspan.start for bspan in bspans]
+                spans = set()
+                for aspan in aspans:
+                    end = aspan.end
+                    lo = bisect_left(bstarts, end + mindist)
+                    hi = bisect_right(bstarts, end + slop, lo)
+                    for j in xrange(lo, hi):
+                        spans.add(aspan.to(bspans[j]))
+                aspans = sorted(spans)
+            return aspans
+
+    class TermPairMatcher(SpanNear2Matcher):
+        """Specialized version of :class:`SpanNear2.SpanNear2Matcher` for
+        exactly two sub-matchers that each produce single-position spans,
+        such as the postings of the words in a two-word phrase. The spans must
+        be ordered and not overlap (``mindist > 0``).
+
+        Because the positions of each term are sorted and unique, the matching
+        pairs can be found with a single merge over the two position lists,
+        and they come out already sorted and without duplicates, so this
+        doesn't build a set of candidate spans and sort it for every document.
+        """
+
+        def _get_spans(self):
+            a, b = self.ms
+            apos = a.value_as("positions")
+            bpos = b.value_as("positions")
+            mindist = self.mindist
+            slop = self.slop
+
+            pairs = []
+            blen = len(bpos)
+            j = 0
+            for i, pos in enumerate(apos):
+                # Move past B positions that are too close to (or before) A.
+                # The next A position is further along, so they can't match
+                # it either
+                start = pos + mindist
+                while j < blen and bpos[j] < start:
+                    j += 1
+                if j == blen:
+                    break
+
+                end = pos + slop
+                k = j
+                while k < blen and bpos[k] <= end:
+                    pairs.append((i, k))
+                    k += 1
+
+            if not pairs:
+                return []
+            if a.supports("characters"):
+                aspans = a.spans()
+                bspans = b.spans()
+                return [aspans[i].to(bspans[k]) for i, k in pairs]
+            return [Span(apos[i], bpos[k]) for i, k in pairs]
+
 
 class SpanOr(SpanQuery):
     """Matches documents that match any of a list of sub-queries. Unlike
@@ -33,9 +33,25 @@ from collections import defaultdict
 
 from whoosh import matching
 from whoosh.analysis import Token
-from whoosh.compat import bytes_type, text_type, u
+from whoosh.compat import bytes_type, text_type, u, xrange
 from whoosh.lang.morph_en import variations
 from whoosh.query import qcore
+from whoosh.util.cache import lru_cache
+
+try:
+    # RE2 matches in linear time, without backtracking
+    import re2
+except ImportError:
+    re2 = None
+
+
+@lru_cache(maxsize=4096)
+def _variations(text):
+    # variations() is a pure function that runs a lot of regular expressions,
+    # and the same words come up again and again in queries, so remember the
+    # results. Store them as a frozenset so the cached value can't be changed
+    # and duplicate variations are only probed once
+    return frozenset(variations(text))
 
 
 class Term(qcore.Query):
@@ -45,6 +61,11 @@ class Term(qcore.Query):
     """
 
     __inittypes__ = dict(fieldname=str, text=text_type, boost=float)
+    # Cached hash value and string form, see __hash__() and __unicode__().
+    # Like other queries, a term shouldn't be changed once it's been used;
+    # copies (e.g. from replace() and with_boost()) don't keep these
+    _hash = None
+    _ustr = None
 
     def __init__(self, fieldname, text, boost=1.0, minquality=None):
         self.fieldname = fieldname
@@ -53,6 +74,8 @@ class Term(qcore.Query):
         self.minquality = minquality
 
     def __eq__(self, other):
+        if other is self:
+            return True
         return (other
                 and self.__class__ is other.__class__
                 and self.fieldname == other.fieldname
@@ -67,6 +90,13 @@ class Term(qcore.Query):
         return r
 
     def __unicode__(self):
+        # Compound queries convert all their terms to strings every time
+        # they're converted (e.g. when logging or building cache keys), so
+        # only format each term once
+        t = self._ustr
+        if t is not None:
+            return t
+
         text = self.text
         if isinstance(text, bytes_type):
             try:
@@ -74,15 +104,22 @@ class Term(qcore.Query):
             except UnicodeDecodeError:
                 text = repr(text)
 
-        t = u("%s:%s") % (self.fieldname, text)
         if self.boost != 1:
-            t += u("^") + text_type(self.boost)
+            t = u("%s:%s^%s") % (self.fieldname, text, self.boost)
+        else:
+            t = u("%s:%s") % (self.fieldname, text)
+        self._ustr = t
         return t
 
     __str__ = __unicode__
 
     def __hash__(self):
-        return hash(self.fieldname) ^ hash(self.text) ^ hash(self.boost)
+        # Large expanded queries hash the same Term objects many times (e.g.
+        # when normalize() removes duplicates), so compute the hash once
+        h = self._hash
+        if h is None:
+            h = self._hash = hash((self.fieldname, self.text, self.boost))
+        return h
 
     def has_terms(self):
         return True
@@ -104,13 +141,12 @@ class Term(qcore.Query):
 
     def estimate_size(self, ixreader):
         fieldname = self.fieldname
-        if fieldname not in ixreader.schema:
-            return 0
-
-        field = ixreader.schema[fieldname]
         try:
+            # Look the field up once instead of testing "in schema" first,
+            # since dynamic field names are matched against every pattern
+            field = ixreader.schema[fieldname]
             text = field.to_bytes(self.text)
-        except ValueError:
+        except (KeyError, ValueError):
             return 0
 
         return ixreader.doc_frequency(fieldname, text)
@@ -118,13 +154,10 @@ class Term(qcore.Query):
     def matcher(self, searcher, context=None):
         fieldname = self.fieldname
         text = self.text
-        if fieldname not in searcher.schema:
-            return matching.NullMatcher()
-
-        field = searcher.schema[fieldname]
         try:
+            field = searcher.schema[fieldname]
             text = field.to_bytes(text)
-        except ValueError:
+        except (KeyError, ValueError):
             return matching.NullMatcher()
 
         if (self.fieldname, text) in searcher.reader():
@@ -149,6 +182,10 @@ class MultiTerm(qcore.Query):
     """
 
     constantscore = False
+    # When an unscored query expands to at least this many terms, and the
+    # caller doesn't need the current posting, collect the matching document
+    # numbers in a set instead of building a union of matchers
+    BITMAP_CLAUSES = 64
 
     def _btexts(self, ixreader):
         raise NotImplementedError(self.__class__.__name__)
@@ -174,9 +211,10 @@ class MultiTerm(qcore.Query):
     def simplify(self, ixreader):
         fieldname = self.field()
 
-        if fieldname not in ixreader.schema:
-            return qcore.NullQuery()
-        field = ixreader.schema[fieldname]
+        try:
+            field = ixreader.schema[fieldname]
+        except KeyError:
+            return qcore.NullQuery
 
         existing = []
         for btext in sorted(set(self._btexts(ixreader))):
@@ -203,30 +241,73 @@ class MultiTerm(qcore.Query):
 
     def matcher(self, searcher, context=None):
         from whoosh.query import Or
+        from whoosh.util import make_weighted_tree
 
         fieldname = self.field()
         constantscore = self.constantscore
 
         reader = searcher.reader()
-        qs = [Term(fieldname, word) for word in self._btexts(reader)
-              if word]
-        if not qs:
+        btexts = [btext for btext in self._btexts(reader) if btext]
+        if not btexts:
             return matching.NullMatcher()
 
-        if len(qs) == 1:
+        if len(btexts) == 1:
             # If there's only one term, just use it
-            m = qs[0].matcher(searcher, context)
+            return Term(fieldname, btexts[0]).matcher(searcher, context)
+
+        # Decide whether the caller wants scores before the constant score
+        # setting below changes the context. A constant score query still
+        # gets its postings scored by the searcher's weighting, so only an
+        # unscored (boolean) search can skip the scores
+        unscored = context is not None and context.weighting is None
+
+        if constantscore:
+            # To tell the sub-matchers that score doesn't matter, set
+            # weighting to None
+            if context:
+                context = context.set(weighting=None)
+            else:
+                from whoosh.searching import SearchContext
+                context = SearchContext(weighting=None)
+
+        # The expanded terms all came from the reader, so get the matchers
+        # straight from the searcher instead of wrapping each term in a Term
+        # query and the lot in an Or query, only to have them unwrapped again
+        w = context.weighting if context else searcher.weighting
+        ms = [searcher.postings(fieldname, btext, weighting=w)
+              for btext in btexts]
+
+        needs_current = context.needs_current if context else True
+        doccount = searcher.doc_count_all()
+        if (not needs_current and unscored
+                and len(ms) >= self.BITMAP_CLAUSES):
+            # Scores don't matter, so just OR the posting lists together into
+            # a compressed set of document numbers, which is much cheaper
+            # than a deep tree of union matchers
+            from whoosh.idsets import RoaringIdSet
+
+            docset = RoaringIdSet()
+            for m in ms:
+                docset.update(m.all_ids())
+            if not docset:
+                return matching.NullMatcher()
+            return matching.ListMatcher(list(docset), all_weights=self.boost)
+
+        # Choose how to union the matchers using the same heuristic as
+        # Or._matcher()
+        if (len(ms) < Or.TOO_MANY_CLAUSES
+            and (needs_current or len(ms) == 2 or doccount > 5000)):
+            # Build a tree of union matchers weighted by document frequency
+            w_ms = [(reader.doc_frequency(fieldname, btext), m)
+                    for btext, m in zip(btexts, ms)]
+            m = make_weighted_tree(matching.UnionMatcher, w_ms)
+            if self.boost != 1.0:
+                m = matching.WrappingMatcher(m, self.boost)
         else:
-            if constantscore:
-                # To tell the sub-query that score doesn't matter, set weighting
-                # to None
-                if context:
-                    context = context.set(weighting=None)
-                else:
-                    from whoosh.searching import SearchContext
-                    context = SearchContext(weighting=None)
-            # Or the terms together
-            m = Or(qs, boost=self.boost).matcher(searcher, context)
+            # Pre-load all the matches into an array
+            scored = context.weighting is not None if context else True
+            m = matching.ArrayUnionMatcher(ms, doccount, boost=self.boost,
+                                           scored=scored)
         return m
 
 
@@ -262,6 +343,9 @@ class PatternQuery(MultiTerm):
     def _get_pattern(self):
         raise NotImplementedError
 
+    def _compile_pattern(self):
+        return re.compile(self._get_pattern())
+
     def _find_prefix(self, text):
         # Subclasses/instances should set the SPECIAL_CHARS attribute to a set
         # of characters that mark the end of the literal prefix
@@ -272,10 +356,17 @@ class PatternQuery(MultiTerm):
                 break
         return text[:i]
 
+    def _literal_test(self):
+        # Subclasses can return a cheap function that takes a candidate string
+        # and returns False if it can't possibly match the pattern, to avoid
+        # running the regular expression on every term. The default is None,
+        # meaning check every candidate with the expression
+        return None
+
     def _btexts(self, ixreader):
         field = ixreader.schema[self.fieldname]
 
-        exp = re.compile(self._get_pattern())
+        exp = self._compile_pattern()
         prefix = self._find_prefix(self.text)
         if prefix:
             candidates = ixreader.expand_prefix(self.fieldname, prefix)
@@ -283,9 +374,10 @@ class PatternQuery(MultiTerm):
             candidates = ixreader.lexicon(self.fieldname)
 
         from_bytes = field.from_bytes
+        test = self._literal_test()
         for btext in candidates:
             text = from_bytes(btext)
-            if exp.match(text):
+            if (test is None or test(text)) and exp.match(text):
                 yield btext
 
 
@@ -330,6 +422,101 @@ class Wildcard(PatternQuery):
     def _get_pattern(self):
         return fnmatch.translate(self.text)
 
+    def _linear_pattern(self):
+        # Returns a regular expression for the glob that only uses syntax RE2
+        # understands (fnmatch.translate() can produce groups RE2 rejects), or
+        # None if the glob contains character ranges
+        if "[" in self.text:
+            return None
+        parts = []
+        for char in self.text:
+            if char == "*":
+                parts.append(".*")
+            elif char == "?":
+                parts.append(".")
+            elif char.isalnum() or char == "_":
+                parts.append(char)
+            else:
+                parts.append("\\" + char)
+        # Without (?m), RE2's $ only matches at the very end of the text
+        return "(?s)" + "".join(parts) + "$"
+
+    def _compile_pattern(self):
+        # A glob like *a*b*c* can make the backtracking re module take time
+        # proportional to the square of the term length or worse, so use RE2
+        # if it's available
+        if re2 is not None:
+            pattern = self._linear_pattern()
+            if pattern is not None:
+                try:
+                    return re2.compile(pattern)
+                except Exception:
+                    pass
+        return re.compile(self._get_pattern())
+
+    def _literal_runs(self):
+        # Returns a list of the runs of literal characters in the glob, or
+        # None if the glob contains character ranges, which this doesn't try
+        # to parse
+        text = self.text
+        if "[" in text:
+            return None
+        return [run for run in re.split("[*?]", text) if run]
+
+    def _literal_test(self):
+        # Any match must contain every run of literal characters in the glob,
+        # so use a substring test (or a suffix test, if the glob ends with a
+        # literal) to weed out most terms before running the regex. This
+        # matters for globs without a prefix, which have to check the whole
+        # lexicon
+        text = self.text
+        runs = self._literal_runs()
+        if not runs:
+            return None
+
+        if text[-1] not in "*?":
+            suffix = runs[-1]
+            return lambda t: t.endswith(suffix)
+
+        if text[0] not in "*?":
+            # The leading run is the prefix, which the candidates already have
+            runs = runs[1:]
+            if not runs:
+                return None
+        infix = max(runs, key=len)
+        return lambda t: infix in t
+
+    def _btexts(self, ixreader):
+        # If the glob has no prefix but has literal runs of at least three
+        # characters, and the reader has a trigram index for the field, get
+        # the candidate terms by intersecting the trigram sets for the runs,
+        # instead of scanning the whole lexicon
+        runs = self._literal_runs()
+        if runs and not self._find_prefix(self.text):
+            grams = set(run[i:i + 3] for run in runs
+                        for i in xrange(len(run) - 2))
+            if grams:
+                index = ixreader._ngram_index(self.fieldname, 3)
+                if index is not None:
+                    return self._ngram_btexts(ixreader, index, grams)
+        return PatternQuery._btexts(self, ixreader)
+
+    def _ngram_btexts(self, ixreader, index, grams):
+        sets = []
+        for gram in grams:
+            if gram not in index:
+                # No term contains this trigram, so nothing can match
+                return
+            sets.append(index[gram])
+        sets.sort(key=len)
+        candidates = sets[0].intersection(*sets[1:])
+
+        exp = self._compile_pattern()
+        from_bytes = ixreader.schema[self.fieldname].from_bytes
+        for btext in sorted(candidates):
+            if exp.match(from_bytes(btext)):
+                yield btext
+
     def normalize(self):
         # If there are no wildcard characters in this "wildcard", turn it into
         # a simple Term
@@ -356,8 +543,6 @@ class Wildcard(PatternQuery):
         else:
             return PatternQuery.matcher(self, searcher, context)
 
-    # _btexts() implemented in PatternQuery
-
 
 class Regex(PatternQuery):
     """Matches documents that contain any terms that match a regular
@@ -504,23 +689,31 @@ class Variations(ExpandingTerm):
         return r
 
     def __eq__(self, other):
-        return (other and self.__class__ is other.__class__
+        if other is self:
+            return True
+        return (self.__class__ is other.__class__
                 and self.fieldname == other.fieldname
                 and self.text == other.text and self.boost == other.boost)
 
     def __hash__(self):
-        return hash(self.fieldname) ^ hash(self.text) ^ hash(self.boost)
+        return hash((self.fieldname, self.text, self.boost))
 
     def _btexts(self, ixreader):
         fieldname = self.fieldname
         to_bytes = ixreader.schema[fieldname].to_bytes
-        for word in variations(self.text):
+        btexts = set()
+        for word in _variations(self.text):
             try:
-                btext = to_bytes(word)
+                btexts.add(to_bytes(word))
             except ValueError:
                 continue
 
-            if (fieldname, btext) in ixreader:
+        # Check the variations in lexicon order, like the other multi-term
+        # queries produce their terms. The term index is hashed, so probing
+        # each variation is cheaper than walking the lexicon between them
+        contains = ixreader.__contains__
+        for btext in sorted(btexts):
+            if contains((fieldname, btext)):
                 yield btext
 
     def __unicode__(self):
@@ -85,6 +85,8 @@ class Not(qcore.Query):
     """
 
     __inittypes__ = dict(query=qcore.Query)
+    # Cached result of normalize()
+    _norm_cache = None
 
     def __init__(self, query, boost=1.0):
         """
@@ -125,11 +127,16 @@ class Not(qcore.Query):
         return self.__class__(fn(self.query))
 
     def normalize(self):
-        q = self.query.normalize()
-        if q is qcore.NullQuery:
-            return q
-        else:
-            return self.__class__(q, boost=self.boost)
+        norm = self._norm_cache
+        if norm is None:
+            q = self.query.normalize()
+            if q is qcore.NullQuery:
+                norm = q
+            else:
+                norm = self.__class__(q, boost=self.boost)
+                norm._norm_cache = norm
+            self._norm_cache = norm
+        return norm
 
     def field(self):
         return None
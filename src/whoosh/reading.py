@@ -30,15 +30,57 @@
 
 from math import log
 from bisect import bisect_right
-from heapq import heapify, heapreplace, heappop, nlargest
+from copy import copy
+from heapq import merge, nlargest
+from itertools import chain, groupby
+from operator import itemgetter
 
 from whoosh import columns
 from whoosh.compat import abstractmethod
-from whoosh.compat import xrange, zip_, next, iteritems
+from whoosh.compat import byte, xrange, zip_, next, iteritems
 from whoosh.filedb.filestore import OverlayStorage
 from whoosh.matching import MultiMatcher
-from whoosh.support.levenshtein import distance
+from whoosh.support.levenshtein import within
 from whoosh.system import emptybytes
+from whoosh.util.cache import bounded_cache
+
+
+# Helper functions
+
+def _item_fieldname(item):
+    # Returns the field name from a ((fieldname, text), terminfo) item
+    return item[0][0]
+
+
+def _prefix_limit(prefix):
+    # Returns the smallest bytestring greater than every bytestring that
+    # starts with the given prefix, or None if there isn't one (the prefix is
+    # empty or all 0xFF bytes). In a sorted list of terms, the terms with the
+    # prefix are the ones from the prefix up to (not including) this limit
+    prefix = prefix.rstrip(b"\xff")
+    if not prefix:
+        return None
+    return prefix[:-1] + byte(ord(prefix[-1:]) + 1)
+
+
+def _prefix_terms(terms, fieldname, prefix):
+    # Yields the texts from an iterator of sorted (fieldname, text) pairs that
+    # starts at the given prefix, until the terms no longer have the prefix.
+    # Comparing each term to the limit is cheaper than calling startswith()
+    limit = _prefix_limit(prefix)
+    for fn, text in terms:
+        if fn != fieldname or (limit is not None and text >= limit):
+            return
+        yield text
+
+
+def _unique_sorted(items):
+    # Yields the items from a sorted iterator, skipping repeats
+    last = None
+    for item in items:
+        if item != last:
+            yield item
+            last = item
 
 
 # Exceptions
@@ -63,6 +105,10 @@ class TermInfo(object):
     optimizations and scoring algorithms.
     """
 
+    # Readers create one of these for every term they look up or iterate over
+    __slots__ = ("_weight", "_df", "_minlength", "_maxlength", "_maxweight",
+                 "_minid", "_maxid")
+
     def __init__(self, weight=0, df=0, minlength=None,
                  maxlength=0, maxweight=0, minid=None, maxid=0):
         self._weight = weight
@@ -133,6 +179,17 @@ class TermInfo(object):
 
         return self._maxid
 
+    def with_offset(self, offset):
+        """Returns a copy of this object with the document IDs shifted by the
+        given offset. The object itself isn't changed, since readers may hand
+        out the same object again.
+        """
+
+        ti = copy(self)
+        ti._minid += offset
+        ti._maxid += offset
+        return ti
+
 
 # Reader base class
 
@@ -181,9 +238,13 @@ class IndexReader(object):
         return True
 
     def _text_to_bytes(self, fieldname, text):
-        if fieldname not in self.schema:
+        try:
+            fieldobj = self.schema[fieldname]
+        except KeyError:
+            fieldobj = None
+        if fieldobj is None:
             raise TermNotFound((fieldname, text))
-        return self.schema[fieldname].to_bytes(text)
+        return fieldobj.to_bytes(text)
 
     def close(self):
         """Closes the open files associated with this reader.
@@ -238,10 +299,8 @@ class IndexReader(object):
         """
 
         prefix = self._text_to_bytes(fieldname, prefix)
-        for fn, text in self.terms_from(fieldname, prefix):
-            if fn != fieldname or not text.startswith(prefix):
-                return
-            yield text
+        return _prefix_terms(self.terms_from(fieldname, prefix), fieldname,
+                             prefix)
 
     def lexicon(self, fieldname):
         """Yields all bytestrings in the given field.
@@ -261,6 +320,59 @@ class IndexReader(object):
         for btext in self.lexicon(fieldname):
             yield from_bytes(btext)
 
+    # Building a trigram index costs more than scanning the lexicon once and
+    # keeps a set of terms for every trigram, so a field only gets one after
+    # this many scans, and a reader keeps at most this many of them
+    NGRAM_SCANS = 3
+    NGRAM_FIELDS = 2
+
+    def _ngram_index(self, fieldname, size=3, build=False):
+        # Returns a dictionary mapping each substring of length ``size`` in
+        # the (decoded) terms of the given field to a set of the bytestrings
+        # of the terms containing it. This lets pattern queries without a
+        # literal prefix find candidate terms without scanning the lexicon.
+        # Until the field has been asked for more than NGRAM_SCANS times (or
+        # if build is True) this returns None and the caller should scan the
+        # lexicon instead
+
+        # Some readers (e.g. the memory codec's) see documents added after
+        # they were opened, so each index remembers the document count it was
+        # built at and is rebuilt if that changes
+        doccount = self.doc_count_all()
+        cache = self._ngram_cache
+        key = (fieldname, size)
+        if key in cache:
+            builtcount, index = cache[key]
+            if builtcount == doccount:
+                return index
+            del cache[key]
+            build = True
+
+        scans = self._ngram_scans
+        scans[key] = scans.get(key, 0) + 1
+        if not build and scans[key] <= self.NGRAM_SCANS:
+            return None
+
+        index = {}
+        from_bytes = self.schema[fieldname].from_bytes
+        for btext in self.lexicon(fieldname):
+            text = from_bytes(btext)
+            for i in xrange(len(text) - size + 1):
+                gram = text[i:i + size]
+                if gram in index:
+                    index[gram].add(btext)
+                else:
+                    index[gram] = set([btext])
+
+        if len(cache) >= self.NGRAM_FIELDS:
+            # Make room by dropping another field's index, which has to earn
+            # its place again before it's rebuilt
+            oldkey = next(iter(cache))
+            del cache[oldkey]
+            del scans[oldkey]
+        cache[key] = (doccount, index)
+        return index
+
     def __iter__(self):
         """Yields ((fieldname, text), terminfo) tuples for each term in the
         reader, in lexical order.
@@ -296,8 +408,9 @@ class IndexReader(object):
         """
 
         prefix = self._text_to_bytes(fieldname, prefix)
-        for text, terminfo in self.iter_field(fieldname, prefix):
-            if not text.startswith(prefix):
+        limit = _prefix_limit(prefix)
+        for (fn, text), terminfo in self.iter_from(fieldname, prefix):
+            if fn != fieldname or (limit is not None and text >= limit):
                 return
             yield (text, terminfo)
 
@@ -313,6 +426,9 @@ class IndexReader(object):
         """Returns an iterator of all (undeleted) document IDs in the reader.
         """
 
+        if not self.has_deletions():
+            return iter(xrange(self.doc_count_all()))
+
         is_deleted = self.is_deleted
         return (docnum for docnum in xrange(self.doc_count_all())
                 if not is_deleted(docnum))
@@ -425,9 +541,8 @@ class IndexReader(object):
 
         for fieldname, btext in self.all_terms():
             m = self.postings(fieldname, btext)
-            while m.is_active():
-                yield (fieldname, btext, m.id(), m.weight(), m.value())
-                m.next()
+            for docnum, weight, value in m.all_postings():
+                yield (fieldname, btext, docnum, weight, value)
 
     @abstractmethod
     def postings(self, fieldname, text):
@@ -489,17 +604,17 @@ class IndexReader(object):
             term vector's data in, for example "weights".
         """
 
+        # Read the vector postings in bulk (a block at a time for on-disk
+        # vectors) instead of stepping the matcher through each one
         vec = self.vector(docnum, fieldname)
         if astype == "weight":
-            while vec.is_active():
-                yield (vec.id(), vec.weight())
-                vec.next()
+            for id, weight, _ in vec.all_postings():
+                yield (id, weight)
         else:
             format_ = self.schema[fieldname].format
             decoder = format_.decoder(astype)
-            while vec.is_active():
-                yield (vec.id(), decoder(vec.value()))
-                vec.next()
+            for id, _, value in vec.all_postings():
+                yield (id, decoder(value))
 
     def corrector(self, fieldname):
         """Returns a :class:`whoosh.spelling.Corrector` object that suggests
@@ -533,20 +648,26 @@ class IndexReader(object):
             not be yielded.
         """
 
-        fieldobj = self.schema[fieldname]
-        for btext in self.expand_prefix(fieldname, text[:prefix]):
-            word = fieldobj.from_bytes(btext)
-            k = distance(word, text, limit=maxdist)
-            if k <= maxdist:
-                yield word
+        from_bytes = self.schema[fieldname].from_bytes
+        words = (from_bytes(btext) for btext
+                 in self.expand_prefix(fieldname, text[:prefix]))
+        # The words come out in sorted order, so the distance calculations
+        # for shared prefixes can be reused and hopeless prefixes skipped
+        return within(text, words, maxdist)
+
+    def _prefix_stats(self, fieldname, prefix):
+        # Yields (text, weight, doc frequency) tuples for the terms in the
+        # given field with the given prefix
+        for text, terminfo in self.iter_prefix(fieldname, prefix):
+            yield text, terminfo.weight(), terminfo.doc_frequency()
 
     def most_frequent_terms(self, fieldname, number=5, prefix=''):
         """Returns the top 'number' most frequent terms in the given field as a
         list of (frequency, text) tuples.
         """
 
-        gen = ((terminfo.weight(), text) for text, terminfo
-               in self.iter_prefix(fieldname, prefix))
+        gen = ((weight, text) for text, weight, _
+               in self._prefix_stats(fieldname, prefix))
         return nlargest(number, gen)
 
     def most_distinctive_terms(self, fieldname, number=5, prefix=''):
@@ -555,9 +676,19 @@ class IndexReader(object):
         """
 
         N = float(self.doc_count())
-        gen = ((terminfo.weight() * log(N / terminfo.doc_frequency()), text)
-               for text, terminfo in self.iter_prefix(fieldname, prefix))
-        return nlargest(number, gen)
+        # Most terms share a handful of small document frequencies, so only
+        # compute the log once for each distinct frequency
+        idfs = {}
+
+        def scored():
+            for text, weight, df in self._prefix_stats(fieldname, prefix):
+                try:
+                    idf = idfs[df]
+                except KeyError:
+                    idf = idfs[df] = log(N / df)
+                yield (weight * idf, text)
+
+        return nlargest(number, scored())
 
     def leaf_readers(self):
         """Returns a list of (IndexReader, docbase) pairs for the child readers
@@ -601,6 +732,18 @@ class SegmentReader(IndexReader):
         self._segment = segment
         self._segid = self._segment.segment_id()
         self._gen = generation
+        # Maps field names to field objects, so the term methods don't have to
+        # go through the schema every time they're called
+        self._fieldobjs = {}
+        # Names of stored fields that have been checked against the schema
+        self._stored_names = set()
+        # (deleted count, frozenset of deleted document numbers) used to
+        # filter postings
+        self._deleted_cache = None
+        # Trigram indexes built by _ngram_index(), and how many times each
+        # has been asked for
+        self._ngram_cache = {}
+        self._ngram_scans = {}
 
         # self.files is a storage object from which to load the segment files.
         # This is different from the general storage (which will be used for
@@ -660,10 +803,11 @@ class SegmentReader(IndexReader):
         if self.is_closed:
             raise ReaderClosed
         fieldname, text = term
-        if fieldname not in self.schema:
+        try:
+            fieldobj = self._field(fieldname)
+        except TermNotFound:
             return False
-        text = self._text_to_bytes(fieldname, text)
-        return (fieldname, text) in self._terms
+        return (fieldname, fieldobj.to_bytes(text)) in self._terms
 
     def close(self):
         if self.is_closed:
@@ -682,10 +826,23 @@ class SegmentReader(IndexReader):
         if self.is_closed:
             raise ReaderClosed
         assert docnum >= 0
-        schema = self.schema
-        sfs = self._perdoc.stored_fields(docnum)
+        return self._schema_stored(self._perdoc.stored_fields(docnum))
+
+    def _schema_stored(self, sfs):
+        # Usually every stored field is one we've already seen is in the
+        # schema, so the dict can be returned as is
+        names = self._stored_names
+        if names.issuperset(sfs):
+            return sfs
+
         # Double-check with schema to filter out removed fields
-        return dict(item for item in iteritems(sfs) if item[0] in schema)
+        schema = self.schema
+        result = {}
+        for fieldname, value in iteritems(sfs):
+            if fieldname in schema:
+                names.add(fieldname)
+                result[fieldname] = value
+        return result
 
     # Delegate doc methods to the per-doc reader
 
@@ -697,12 +854,15 @@ class SegmentReader(IndexReader):
     def iter_docs(self):
         if self.is_closed:
             raise ReaderClosed
-        return self._perdoc.iter_docs()
+        filt = self._schema_stored
+        return ((docnum, filt(sfs)) for docnum, sfs
+                in self._perdoc.iter_docs())
 
     def all_stored_fields(self):
         if self.is_closed:
             raise ReaderClosed
-        return self._perdoc.all_stored_fields()
+        filt = self._schema_stored
+        return (filt(sfs) for sfs in self._perdoc.all_stored_fields())
 
     def field_length(self, fieldname):
         if self.is_closed:
@@ -731,44 +891,67 @@ class SegmentReader(IndexReader):
 
     #
 
+    def _field(self, fieldname):
+        # Returns the field object for the given name from the cache, or looks
+        # it up in the schema and caches it
+        try:
+            return self._fieldobjs[fieldname]
+        except KeyError:
+            pass
+
+        if fieldname not in self.schema:
+            raise TermNotFound("No field %r" % fieldname)
+        fieldobj = self._fieldobjs[fieldname] = self.schema[fieldname]
+        return fieldobj
+
     def _test_field(self, fieldname):
+        # Checks that the field exists and is indexed, and returns the field
+        # object
         if self.is_closed:
             raise ReaderClosed
-        if fieldname not in self.schema:
-            raise TermNotFound("No field %r" % fieldname)
-        if self.schema[fieldname].format is None:
+        fieldobj = self._field(fieldname)
+        if fieldobj.format is None:
             raise TermNotFound("Field %r is not indexed" % fieldname)
+        return fieldobj
 
     def indexed_field_names(self):
         return self._terms.indexed_field_names()
 
+    def _schema_terms(self, items, key=itemgetter(0)):
+        # Filters out terms in fields that were removed from the schema. The
+        # terms come grouped by field, so only check each field once instead
+        # of calling Schema.__contains__ (which isn't cheap) for every term
+        schema = self.schema
+        for fieldname, group in groupby(items, key):
+            if fieldname in schema:
+                for item in group:
+                    yield item
+
     def all_terms(self):
         if self.is_closed:
             raise ReaderClosed
-        schema = self.schema
-        return ((fieldname, text) for fieldname, text in self._terms.terms()
-                if fieldname in schema)
+        return self._schema_terms(self._terms.terms())
 
     def terms_from(self, fieldname, prefix):
-        self._test_field(fieldname)
-        prefix = self._text_to_bytes(fieldname, prefix)
-        schema = self.schema
-        return ((fname, text) for fname, text
-                in self._terms.terms_from(fieldname, prefix)
-                if fname in schema)
+        fieldobj = self._test_field(fieldname)
+        prefix = fieldobj.to_bytes(prefix)
+        return self._schema_terms(self._terms.terms_from(fieldname, prefix))
 
     def term_info(self, fieldname, text):
-        self._test_field(fieldname)
-        text = self._text_to_bytes(fieldname, text)
+        fieldobj = self._test_field(fieldname)
+        text = fieldobj.to_bytes(text)
         try:
             return self._terms.term_info(fieldname, text)
         except KeyError:
             raise TermNotFound("%s:%r" % (fieldname, text))
 
     def expand_prefix(self, fieldname, prefix):
-        self._test_field(fieldname)
-        prefix = self._text_to_bytes(fieldname, prefix)
-        return IndexReader.expand_prefix(self, fieldname, prefix)
+        fieldobj = self._test_field(fieldname)
+        prefix = fieldobj.to_bytes(prefix)
+        # The field is known to be in the schema, so read the terms straight
+        # from the terms reader without checking the schema for each one
+        return _prefix_terms(self._terms.terms_from(fieldname, prefix),
+                             fieldname, prefix)
 
     def lexicon(self, fieldname):
         self._test_field(fieldname)
@@ -777,33 +960,41 @@ class SegmentReader(IndexReader):
     def __iter__(self):
         if self.is_closed:
             raise ReaderClosed
-        schema = self.schema
-        return ((term, terminfo) for term, terminfo in self._terms.items()
-                if term[0] in schema)
+        return self._schema_terms(self._terms.items(), _item_fieldname)
 
     def iter_from(self, fieldname, text):
-        self._test_field(fieldname)
-        schema = self.schema
-        text = self._text_to_bytes(fieldname, text)
-        for term, terminfo in self._terms.items_from(fieldname, text):
-            if term[0] not in schema:
-                continue
-            yield (term, terminfo)
+        fieldobj = self._test_field(fieldname)
+        text = fieldobj.to_bytes(text)
+        items = self._terms.items_from(fieldname, text)
+        for item in self._schema_terms(items, _item_fieldname):
+            yield item
+
+    def _prefix_stats(self, fieldname, prefix):
+        # Get the numbers straight from the codec instead of building a
+        # TermInfo object for every term
+        fieldobj = self._test_field(fieldname)
+        prefix = fieldobj.to_bytes(prefix)
+        limit = _prefix_limit(prefix)
+        stats = self._terms.term_stats_from(fieldname, prefix)
+        for (fn, text), weight, df in stats:
+            if fn != fieldname or (limit is not None and text >= limit):
+                return
+            yield text, weight, df
 
     def frequency(self, fieldname, text):
-        self._test_field(fieldname)
-        text = self._text_to_bytes(fieldname, text)
+        fieldobj = self._test_field(fieldname)
+        text = fieldobj.to_bytes(text)
         try:
             return self._terms.frequency(fieldname, text)
-        except KeyError:
+        except (KeyError, TermNotFound):
             return 0
 
     def doc_frequency(self, fieldname, text):
-        self._test_field(fieldname)
-        text = self._text_to_bytes(fieldname, text)
+        fieldobj = self._test_field(fieldname)
+        text = fieldobj.to_bytes(text)
         try:
             return self._terms.doc_frequency(fieldname, text)
-        except KeyError:
+        except (KeyError, TermNotFound):
             return 0
 
     def postings(self, fieldname, text, scorer=None):
@@ -811,16 +1002,44 @@ class SegmentReader(IndexReader):
 
         if self.is_closed:
             raise ReaderClosed
-        if fieldname not in self.schema:
-            raise TermNotFound("No  field %r" % fieldname)
-        text = self._text_to_bytes(fieldname, text)
-        format_ = self.schema[fieldname].format
+        fieldobj = self._field(fieldname)
+        text = fieldobj.to_bytes(text)
+        format_ = fieldobj.format
         matcher = self._terms.matcher(fieldname, text, format_, scorer=scorer)
-        deleted = frozenset(self._perdoc.deleted_docs())
+        deleted = self._deleted_set()
         if deleted:
             matcher = FilterMatcher(matcher, deleted, exclude=True)
         return matcher
 
+    def first_id(self, fieldname, text):
+        if not self._deleted_set():
+            # Without deletions the first posting is the term's lowest
+            # document number, which the term info already has, so there's no
+            # need to open a matcher and read a block of postings
+            minid = self.term_info(fieldname, text).min_id()
+            if minid is not None:
+                return minid
+        return IndexReader.first_id(self, fieldname, text)
+
+    def _deleted_set(self):
+        # Returns a frozenset of the deleted document numbers. Every posting
+        # list opened on this reader needs it, so it's only built once. A
+        # writer can delete documents in a segment while a reader on it is
+        # open, so the set is rebuilt if the segment's deleted count changes
+        perdoc = self._perdoc
+        if not perdoc.has_deletions():
+            return frozenset()
+        try:
+            count = self._segment.deleted_count()
+        except NotImplementedError:
+            return frozenset(perdoc.deleted_docs())
+
+        cache = self._deleted_cache
+        if cache is None or cache[0] != count:
+            cache = (count, frozenset(perdoc.deleted_docs()))
+            self._deleted_cache = cache
+        return cache[1]
+
     def vector(self, docnum, fieldname, format_=None):
         if self.is_closed:
             raise ReaderClosed
@@ -890,6 +1109,8 @@ class SegmentReader(IndexReader):
 class EmptyReader(IndexReader):
     def __init__(self, schema):
         self.schema = schema
+        self._ngram_cache = {}
+        self._ngram_scans = {}
 
     def __contains__(self, term):
         return False
@@ -988,34 +1209,85 @@ class MultiReader(IndexReader):
         if readers:
             self.schema = readers[0].schema
 
-        self.doc_offsets = []
-        self.base = 0
-        for r in self.readers:
-            self.doc_offsets.append(self.base)
-            self.base += r.doc_count_all()
+        # Ask each sub-reader for its size once; the running total is kept in
+        # self.base so doc_count_all() doesn't have to ask again
+        self.doc_offsets = offsets = []
+        base = 0
+        for count in [r.doc_count_all() for r in readers]:
+            offsets.append(base)
+            base += count
+        self.base = base
+        # (reader, docbase) pairs handed out by leaf_readers()
+        self._leaves = list(zip_(readers, offsets))
+        self._clear_caches()
 
         self.is_closed = False
 
+    def _clear_caches(self):
+        # Term and field statistics are sums over all the sub-readers, and
+        # scoring asks for the same ones over and over, so remember them.
+        # The segments don't change, so this only has to be redone when a
+        # reader is added
+        self._term_info = bounded_cache(4096)(self._combined_term_info)
+        self._frequency = bounded_cache(4096)(self._total_frequency)
+        self._doc_frequency = bounded_cache(4096)(self._total_doc_frequency)
+        self._fieldstats = {}
+        # The segments' columns don't change, so whether any of them has a
+        # given column doesn't either
+        self._hascolumn = {}
+        self._ngram_cache = {}
+        self._ngram_scans = {}
+
     def _document_segment(self, docnum):
-        return max(0, bisect_right(self.doc_offsets, docnum) - 1)
+        offsets = self.doc_offsets
+        if len(offsets) < 2:
+            return 0
+        return max(0, bisect_right(offsets, docnum) - 1)
 
     def _segment_and_docnum(self, docnum):
-        segmentnum = self._document_segment(docnum)
-        offset = self.doc_offsets[segmentnum]
-        return segmentnum, docnum - offset
+        # This is called for every per-document lookup, so do the search
+        # inline instead of through _document_segment(). The offsets stay in
+        # a list: bisect compares list items directly, which is faster than
+        # searching an array, which has to box every item it looks at
+        offsets = self.doc_offsets
+        if len(offsets) < 2:
+            return 0, docnum
+        segmentnum = bisect_right(offsets, docnum) - 1
+        if segmentnum < 0:
+            segmentnum = 0
+        return segmentnum, docnum - offsets[segmentnum]
+
+    def _reader_and_docnum(self, docnum):
+        # Like _segment_and_docnum(), but returns the sub-reader itself, so
+        # the per-document methods don't have to look it up again
+        offsets = self.doc_offsets
+        readers = self.readers
+        if len(offsets) < 2:
+            return readers[0], docnum
+        segmentnum = bisect_right(offsets, docnum) - 1
+        if segmentnum < 0:
+            segmentnum = 0
+        return readers[segmentnum], docnum - offsets[segmentnum]
 
     def cursor(self, fieldname):
-        return MultiCursor([r.cursor(fieldname) for r in self.readers])
+        return MultiCursor([r.cursor(fieldname) for r in self.readers],
+                           self.doc_offsets)
 
     def is_atomic(self):
         return False
 
     def leaf_readers(self):
-        return zip_(self.readers, self.doc_offsets)
+        return self._leaves
 
     def add_reader(self, reader):
+        # The offsets, leaves and total are all updated in place here, so
+        # adding readers one at a time never has to rebuild anything
+        if self.schema is None:
+            self.schema = reader.schema
         self.readers.append(reader)
         self.doc_offsets.append(self.base)
+        self._leaves.append((reader, self.base))
+        self._clear_caches()
         self.base += reader.doc_count_all()
 
     def close(self):
@@ -1044,52 +1316,16 @@ class MultiReader(IndexReader):
         return any(r.__contains__(term) for r in self.readers)
 
     def _merge_terms(self, iterlist):
-        # Merge-sorts terms coming from a list of term iterators.
-
-        # Create a map so we can look up each iterator by its id() value
-        itermap = {}
-        for it in iterlist:
-            itermap[id(it)] = it
-
-        # Fill in the list with the head term from each iterator.
-
-        current = []
-        for it in iterlist:
-            try:
-                term = next(it)
-            except StopIteration:
-                continue
-            current.append((term, id(it)))
-        # Number of active iterators
-        active = len(current)
-
-        # If only one iterator is active, just yield from it and return
-        if active == 1:
-            term, itid = current[0]
-            it = itermap[itid]
-            yield term
-            for term in it:
-                yield term
-            return
-
-        # Otherwise, do a streaming heap sort of the terms from the iterators
-        heapify(current)
-        while active:
-            # Peek at the first term in the sorted list
-            term = current[0][0]
-
-            # Re-iterate on all items in the list that have that term
-            while active and current[0][0] == term:
-                it = itermap[current[0][1]]
-                try:
-                    nextterm = next(it)
-                    heapreplace(current, (nextterm, id(it)))
-                except StopIteration:
-                    heappop(current)
-                    active -= 1
-
-            # Yield the term
-            yield term
+        # Merge-sorts terms coming from a list of term iterators, yielding
+        # each term once even if several sub-readers have it. heapq.merge()
+        # keeps the heap of iterator heads itself (and streams straight from
+        # the last iterator once the others run out), so all that's left to
+        # do here is skip the duplicates
+        if len(iterlist) == 1:
+            # The terms from a single reader are already sorted and unique,
+            # so hand them out as they are
+            return iter(iterlist[0])
+        return _unique_sorted(merge(*iterlist))
 
     def indexed_field_names(self):
         names = set()
@@ -1105,23 +1341,39 @@ class MultiReader(IndexReader):
                                   for r in self.readers])
 
     def term_info(self, fieldname, text):
-        term = (fieldname, text)
-
-        # Get the term infos for the sub-readers containing the term
-        tis = [(r.term_info(fieldname, text), offset) for r, offset
-               in zip_(self.readers, self.doc_offsets) if term in r]
-
-        # If only one reader had the term, return its terminfo with the offset
-        # added
-        if not tis:
-            raise TermNotFound(term)
+        # The combined info is cached, and None is cached for a missing term,
+        # so the error is raised here, outside the cache. Callers get their
+        # own copy, so changing it doesn't change the cached one
+        ti = self._term_info(fieldname, text)
+        if ti is None:
+            raise TermNotFound((fieldname, text))
+        return ti.with_offset(0)
+
+    def _combined_term_info(self, fieldname, text):
+        # Get the term infos for the sub-readers containing the term. Asking
+        # each sub-reader for the term info and catching the error when it
+        # doesn't have the term looks the term up once per segment, instead
+        # of once for "term in r" and again for term_info()
+        def found():
+            for r, offset in self._leaves:
+                try:
+                    ti = r.term_info(fieldname, text)
+                except (KeyError, TermNotFound):
+                    continue
+                yield ti, offset
 
-        return combine_terminfos(tis)
+        return combine_terminfos(found())
 
     def frequency(self, fieldname, text):
+        return self._frequency(fieldname, text)
+
+    def _total_frequency(self, fieldname, text):
         return sum(r.frequency(fieldname, text) for r in self.readers)
 
     def doc_frequency(self, fieldname, text):
+        return self._doc_frequency(fieldname, text)
+
+    def _total_doc_frequency(self, fieldname, text):
         return sum(r.doc_frequency(fieldname, text) for r in self.readers)
 
     def postings(self, fieldname, text):
@@ -1129,14 +1381,15 @@ class MultiReader(IndexReader):
 
         postreaders = []
         docoffsets = []
-        term = (fieldname, text)
 
-        for i, r in enumerate(self.readers):
-            if term in r:
-                offset = self.doc_offsets[i]
+        # As in term_info(), look the term up once in each sub-reader
+        for r, offset in self._leaves:
+            try:
                 pr = r.postings(fieldname, text)
-                postreaders.append(pr)
-                docoffsets.append(offset)
+            except (KeyError, TermNotFound):
+                continue
+            postreaders.append(pr)
+            docoffsets.append(offset)
 
         if not postreaders:
             raise TermNotFound(fieldname, text)
@@ -1144,7 +1397,10 @@ class MultiReader(IndexReader):
         return MultiMatcher(postreaders, docoffsets)
 
     def first_id(self, fieldname, text):
-        for i, r in enumerate(self.readers):
+        # The sub-readers are asked in order, so this stops at the first one
+        # with the term. Atomic readers answer from the term info when they
+        # can, so the segments before it only cost a term lookup each
+        for r, offset in self._leaves:
             try:
                 id = r.first_id(fieldname, text)
             except (KeyError, TermNotFound):
@@ -1153,121 +1409,192 @@ class MultiReader(IndexReader):
                 if id is None:
                     raise TermNotFound((fieldname, text))
                 else:
-                    return self.doc_offsets[i] + id
+                    return offset + id
 
         raise TermNotFound((fieldname, text))
 
     # Deletion methods
 
+    def all_doc_ids(self):
+        # Let each sub-reader skip its own deleted documents, instead of
+        # finding the sub-reader for every document number to check it
+        for r, offset in self._leaves:
+            if r.has_deletions():
+                for docnum in r.all_doc_ids():
+                    yield docnum + offset
+            else:
+                for docnum in xrange(offset, offset + r.doc_count_all()):
+                    yield docnum
+
     def has_deletions(self):
+        # Not cached: documents can be deleted through a writer's searcher
         return any(r.has_deletions() for r in self.readers)
 
     def is_deleted(self, docnum):
-        segmentnum, segmentdoc = self._segment_and_docnum(docnum)
-        return self.readers[segmentnum].is_deleted(segmentdoc)
+        reader, segmentdoc = self._reader_and_docnum(docnum)
+        return reader.is_deleted(segmentdoc)
 
     def stored_fields(self, docnum):
-        segmentnum, segmentdoc = self._segment_and_docnum(docnum)
-        return self.readers[segmentnum].stored_fields(segmentdoc)
+        reader, segmentdoc = self._reader_and_docnum(docnum)
+        return reader.stored_fields(segmentdoc)
 
     # Columns
 
     def has_column(self, fieldname):
-        return any(r.has_column(fieldname) for r in self.readers)
+        try:
+            return self._hascolumn[fieldname]
+        except KeyError:
+            pass
+        hascol = any(r.has_column(fieldname) for r in self.readers)
+        self._hascolumn[fieldname] = hascol
+        return hascol
 
     def column_reader(self, fieldname, column=None, reverse=False,
                       translate=True):
-        crs = []
-        doc_offsets = []
-        for i, r in enumerate(self.readers):
+        items = []
+        for r, offset in self._leaves:
             if r.has_column(fieldname):
                 cr = r.column_reader(fieldname, column=column, reverse=reverse,
                                      translate=translate)
-                crs.append(cr)
-                doc_offsets.append(self.doc_offsets[i])
-        return columns.MultiColumnReader(crs, doc_offsets)
+                items.append((offset, cr))
+
+        if len(items) == len(self._leaves) == 1:
+            # The union of a single column is just that column, so skip the
+            # wrapper (and the bisect it does on every lookup)
+            return items[0][1]
+
+        default = default_key = None
+        if len(items) < len(self._leaves):
+            # The documents in the segments without the column get the
+            # default value. The combined reader fills those in itself,
+            # instead of asking for an empty reader for each segment. Like a
+            # segment's empty column, their sort key is the untranslated
+            # default
+            fieldobj = self.schema[fieldname]
+            column = column or fieldobj.column_type
+            if column:
+                default = default_key = column.default_value(reverse)
+                if translate:
+                    default = fieldobj.from_column_value(default)
+        return columns.MultiColumnReader.from_sparse(items, self.base, default,
+                                                     default_key)
 
     # Per doc methods
 
     def all_stored_fields(self):
-        for reader in self.readers:
-            for result in reader.all_stored_fields():
-                yield result
+        # Let chain hand the sub-readers' items straight through, instead of
+        # passing each one on from a generator here
+        return chain.from_iterable(r.all_stored_fields() for r in self.readers)
 
     def doc_count_all(self):
-        return sum(dr.doc_count_all() for dr in self.readers)
+        return self.base
 
     def doc_count(self):
         return sum(dr.doc_count() for dr in self.readers)
 
+    def _field_stat(self, name, fieldname, fn):
+        key = (name, fieldname)
+        try:
+            return self._fieldstats[key]
+        except KeyError:
+            pass
+        value = self._fieldstats[key] = fn(getattr(r, name)(fieldname)
+                                           for r in self.readers)
+        return value
+
     def field_length(self, fieldname):
-        return sum(dr.field_length(fieldname) for dr in self.readers)
+        return self._field_stat("field_length", fieldname, sum)
 
     def min_field_length(self, fieldname):
-        return min(r.min_field_length(fieldname) for r in self.readers)
+        return self._field_stat("min_field_length", fieldname, min)
 
     def max_field_length(self, fieldname):
-        return max(r.max_field_length(fieldname) for r in self.readers)
+        return self._field_stat("max_field_length", fieldname, max)
 
     def doc_field_length(self, docnum, fieldname, default=0):
-        segmentnum, segmentdoc = self._segment_and_docnum(docnum)
-        reader = self.readers[segmentnum]
+        reader, segmentdoc = self._reader_and_docnum(docnum)
         return reader.doc_field_length(segmentdoc, fieldname, default=default)
 
     def has_vector(self, docnum, fieldname):
-        segmentnum, segmentdoc = self._segment_and_docnum(docnum)
-        return self.readers[segmentnum].has_vector(segmentdoc, fieldname)
+        reader, segmentdoc = self._reader_and_docnum(docnum)
+        return reader.has_vector(segmentdoc, fieldname)
 
     def vector(self, docnum, fieldname, format_=None):
-        segmentnum, segmentdoc = self._segment_and_docnum(docnum)
-        return self.readers[segmentnum].vector(segmentdoc, fieldname)
+        reader, segmentdoc = self._reader_and_docnum(docnum)
+        return reader.vector(segmentdoc, fieldname)
 
     def vector_as(self, astype, docnum, fieldname):
-        segmentnum, segmentdoc = self._segment_and_docnum(docnum)
-        return self.readers[segmentnum].vector_as(astype, segmentdoc,
-                                                  fieldname)
+        reader, segmentdoc = self._reader_and_docnum(docnum)
+        return reader.vector_as(astype, segmentdoc, fieldname)
 
 
 def combine_terminfos(tis):
-    if len(tis) == 1:
-        ti, offset = tis[0]
-        ti._minid += offset
-        ti._maxid += offset
-        return ti
-
-    # Combine the various statistics
-    w = sum(ti.weight() for ti, _ in tis)
-    df = sum(ti.doc_frequency() for ti, _ in tis)
-    ml = min(ti.min_length() for ti, _ in tis)
-    xl = max(ti.max_length() for ti, _ in tis)
-    xw = max(ti.max_weight() for ti, _ in tis)
-
-    # For min and max ID, we need to add the doc offsets
-    mid = min(ti.min_id() + offset for ti, offset in tis)
-    xid = max(ti.max_id() + offset for ti, offset in tis)
+    """Combines an iterable of ``(terminfo, docoffset)`` pairs from several
+    sub-readers into one :class:`TermInfo`. Returns None if the iterable is
+    empty.
+    """
 
+    count = 0
+    for ti, offset in tis:
+        count += 1
+        if count == 1:
+            first = ti, offset
+            w, df = ti._weight, ti._df
+            ml, xl, xw = ti._minlength, ti._maxlength, ti._maxweight
+            # For min and max ID, we need to add the doc offsets
+            mid, xid = ti._minid + offset, ti._maxid + offset
+            continue
+
+        # Keep the running statistics in local variables, and compare
+        # instead of calling min() and max() for every value
+        w += ti._weight
+        df += ti._df
+        if ti._minlength < ml:
+            ml = ti._minlength
+        if ti._maxlength > xl:
+            xl = ti._maxlength
+        if ti._maxweight > xw:
+            xw = ti._maxweight
+        if ti._minid + offset < mid:
+            mid = ti._minid + offset
+        if ti._maxid + offset > xid:
+            xid = ti._maxid + offset
+
+    if not count:
+        return None
+    if count == 1:
+        # Only one sub-reader has the term. Shift the IDs on a copy, the
+        # sub-reader may hand out the same object again (the memory codec
+        # does)
+        ti, offset = first
+        return ti.with_offset(offset)
     return TermInfo(w, df, ml, xl, xw, mid, xid)
 
 
 class MultiCursor(object):
-    def __init__(self, cursors):
-        self._cursors = [c for c in cursors if c.is_valid()]
+    def __init__(self, cursors, offsets=None):
+        if offsets is None:
+            offsets = [0] * len(cursors)
+        self._cursors = cursors
+        self._offsets = offsets
+        # Positions (in the lists above) of the cursors on the lowest text
         self._low = []
         self._text = None
-        self.next()
+        # The sub-cursors start out on their first terms
+        self._find_low()
 
     def _find_low(self):
         low = []
         lowterm = None
 
-        for c in self._cursors:
+        for i, c in enumerate(self._cursors):
             if c.is_valid():
-                cterm = c.term()
-                if low and cterm == lowterm:
-                    low.append(c)
-                elif low and cterm < lowterm:
-                    low = [c]
+                cterm = c.text()
+                if not low or cterm < lowterm:
+                    low = [i]
                     lowterm = cterm
+                elif cterm == lowterm:
+                    low.append(i)
 
         self._low = low
         self._text = lowterm
@@ -1284,13 +1611,20 @@ class MultiCursor(object):
         return self._find_low()
 
     def next(self):
-        for c in self._cursors:
-            c.next()
+        # Only the cursors on the current text move past it
+        cursors = self._cursors
+        for i in self._low:
+            cursors[i].next()
         return self._find_low()
 
+    def text(self):
+        return self._text
+
     def term_info(self):
-        tis = [c.term_info() for c in self._low]
-        return combine_terminfos(tis) if tis else None
+        cursors = self._cursors
+        offsets = self._offsets
+        return combine_terminfos((cursors[i].term_info(), offsets[i])
+                                 for i in self._low)
 
     def is_valid(self):
-        return any(c.is_valid() for c in self._cursors)
+        return bool(self._low)
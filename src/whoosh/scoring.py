@@ -325,11 +325,19 @@ class BM25FScorer(WeightLengthScorer):
         self.B = B
         self.K1 = K1
         self.qf = qf
+
+        # Fold the parts of the BM25 formula that are constant for this term
+        # so _score() only does the per-document arithmetic. This is
+        # equivalent to bm25(idf, weight, length, avgfl, B, K1)
+        self._numer = self.idf * (K1 + 1)
+        self._base = K1 * (1 - B)
+        self._lengthfactor = K1 * B / self.avgfl
+
         self.setup(searcher, fieldname, text)
 
     def _score(self, weight, length):
-        s = bm25(self.idf, weight, length, self.avgfl, self.B, self.K1)
-        return s
+        return (self._numer * weight
+                / (weight + self._base + self._lengthfactor * length))
 
 
 # DFree model
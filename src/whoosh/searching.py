@@ -36,7 +36,7 @@ from math import ceil
 
 from whoosh import classify, highlight, query, scoring
 from whoosh.compat import iteritems, itervalues, iterkeys, xrange
-from whoosh.idsets import DocIdSet, BitSet
+from whoosh.idsets import DocIdSet, RoaringIdSet
 from whoosh.reading import TermNotFound
 from whoosh.util.cache import lru_cache
 
@@ -444,7 +444,9 @@ class Searcher(object):
         return delset
 
     def _query_to_comb(self, fq):
-        return BitSet(self.docs_for_query(fq), size=self.doc_count_all())
+        # Use a compressed set so the memory used is proportional to the
+        # number of matching documents instead of the size of the index
+        return RoaringIdSet(self.docs_for_query(fq))
 
     def _filter_to_comb(self, obj):
         if obj is None:
@@ -185,9 +185,9 @@ class WhooshModule(Module):
     def findterms(self, terms):
         limit = int(self.options.limit)
         s = self.srch
-        q = query.Term(self.bench.spec.main_field, None)
+        fieldname = self.bench.spec.main_field
         for term in terms:
-            q.text = term
+            q = query.Term(fieldname, term)
             yield s.search(q, limit=limit)
 
 
@@ -9,6 +9,11 @@ def levenshtein(seq1, seq2, limit=None):
     """Returns the Levenshtein edit distance between two strings.
     """
 
+    # The distance is at least the difference in length, so if that's already
+    # over the limit there's no need to fill in the table
+    if limit is not None and abs(len(seq1) - len(seq2)) > limit:
+        return limit + 1
+
     oneago = None
     thisrow = list(range(1, len(seq2) + 1)) + [0]
     for x in xrange(len(seq1)):
@@ -32,6 +37,13 @@ def damerau_levenshtein(seq1, seq2, limit=None):
     """Returns the Damerau-Levenshtein edit distance between two strings.
     """
 
+    # The distance is at least the difference in length, so if that's already
+    # over the limit there's no need to fill in the table
+    if limit is not None and abs(len(seq1) - len(seq2)) > limit:
+        return limit + 1
+    if limit is not None:
+        return _banded_damerau_levenshtein(seq1, seq2, limit)
+
     oneago = None
     thisrow = list(range(1, len(seq2) + 1)) + [0]
     for x in xrange(len(seq1)):
@@ -55,6 +67,126 @@ def damerau_levenshtein(seq1, seq2, limit=None):
     return thisrow[len(seq2) - 1]
 
 
+def _banded_damerau_levenshtein(seq1, seq2, limit):
+    # Damerau-Levenshtein distance that only fills in the diagonal band of the
+    # table where the distance can be at most limit (Ukkonen's cutoff), so it
+    # does O(len * limit) work instead of O(len * len). Any distance over the
+    # limit is returned as limit + 1
+
+    len1 = len(seq1)
+    len2 = len(seq2)
+    if not len1 or not len2:
+        return min(len1 + len2, limit + 1)
+
+    over = limit + 1
+    # Three rows are reused for the whole table instead of creating a new row
+    # for every character. Cells outside the band count as "over the limit"
+    twoago = [over] * (len2 + 2)
+    oneago = list(range(len2 + 1)) + [over]
+    for i in xrange(len2 + 1):
+        if i > limit:
+            oneago[i] = over
+    thisrow = [over] * (len2 + 2)
+
+    for x in xrange(1, len1 + 1):
+        lo = max(1, x - limit)
+        hi = min(len2, x + limit)
+        thisrow[lo - 1] = x if lo == 1 and x <= limit else over
+        thisrow[hi + 1] = over
+
+        char = seq1[x - 1]
+        rowmin = thisrow[lo - 1]
+        for y in xrange(lo, hi + 1):
+            other = seq2[y - 1]
+            cost = oneago[y - 1] + (char != other)
+            if oneago[y] + 1 < cost:
+                cost = oneago[y] + 1
+            if thisrow[y - 1] + 1 < cost:
+                cost = thisrow[y - 1] + 1
+            # Transposition of two adjacent characters
+            if (x > 1 and y > 1 and char == seq2[y - 2]
+                    and seq1[x - 2] == other and twoago[y - 2] + 1 < cost):
+                cost = twoago[y - 2] + 1
+            thisrow[y] = cost
+            if cost < rowmin:
+                rowmin = cost
+
+        if rowmin > limit:
+            return over
+        twoago, oneago, thisrow = oneago, thisrow, twoago
+
+    return min(oneago[len2], over)
+
+
+def within(text, words, maxdist):
+    """Yields the words from the given iterable that are within ``maxdist``
+    Damerau-Levenshtein edits of ``text``.
+
+    This gives the same results as checking each word with
+    :func:`damerau_levenshtein`, but it's much faster on a sorted word list
+    (such as the terms in an index). The rows of the distance table for the
+    prefix a word shares with the previous word are reused instead of being
+    recomputed, and once a prefix is too far from ``text`` for any word
+    starting with it to be within ``maxdist``, the following words with that
+    prefix are skipped without any computation.
+    """
+
+    textlen = len(text)
+    over = maxdist + 1
+    # rows[i] is the row of the distance table for lastword[:i]. Only the
+    # diagonal band of each row where the distance can be within maxdist is
+    # filled in; the cells outside it are left at "over"
+    rows = [[i if i <= maxdist else over for i in xrange(textlen + 1)]]
+    lastword = ""
+    dead = None
+
+    for word in words:
+        if dead is not None and word.startswith(dead):
+            continue
+        dead = None
+
+        wordlen = len(word)
+        # The distance is at least the difference in length
+        if abs(wordlen - textlen) > maxdist:
+            continue
+
+        # Find how much of the table can be kept from the last word
+        common = 0
+        limit = min(len(lastword), wordlen)
+        while common < limit and lastword[common] == word[common]:
+            common += 1
+        del rows[common + 1:]
+
+        for x in xrange(common, wordlen):
+            char = word[x]
+            oneago = rows[x]
+            row = [over] * (textlen + 1)
+            if x < maxdist:
+                row[0] = x + 1
+            for y in xrange(max(0, x - maxdist), min(textlen, x + over)):
+                other = text[y]
+                cost = oneago[y] + (char != other)
+                if oneago[y + 1] + 1 < cost:
+                    cost = oneago[y + 1] + 1
+                if row[y] + 1 < cost:
+                    cost = row[y] + 1
+                # Transposition of two adjacent characters
+                if (x and y and char == text[y - 1] and word[x - 1] == other
+                        and rows[x - 1][y - 1] + 1 < cost):
+                    cost = rows[x - 1][y - 1] + 1
+                row[y + 1] = cost
+            rows.append(row)
+
+            if min(row) > maxdist:
+                # Every word starting with this prefix is too far away
+                dead = word[:x + 1]
+                break
+
+        lastword = word[:len(rows) - 1]
+        if dead is None and rows[-1][textlen] <= maxdist:
+            yield word
+
+
 def relative(a, b):
     """Returns the relative distance between two strings, in the range
     [0-1] where 1 means total equality.
@@ -27,8 +27,9 @@
 
 from __future__ import with_statement
 import random, sys, time
-from bisect import insort, bisect_left
+from bisect import bisect_left
 from functools import wraps
+from heapq import heapify, heappop, heappush
 
 from whoosh.compat import xrange
 
@@ -88,12 +89,18 @@ def make_weighted_tree(fn, ls, **kwargs):
     if not ls:
         raise ValueError("Called make_weighted_tree with empty list")
 
-    ls.sort()
-    while len(ls) > 1:
-        a = ls.pop(0)
-        b = ls.pop(0)
-        insort(ls, (a[0] + b[0], fn(a[1], b[1])))
-    return ls[0][1]
+    # Keep the items in a heap instead of a sorted list, so each merge is
+    # O(log n) instead of O(n). The item's position is used as a tie-breaker
+    # so the arguments themselves are never compared
+    heap = [(weight, i, arg) for i, (weight, arg) in enumerate(ls)]
+    heapify(heap)
+    i = len(heap)
+    while len(heap) > 1:
+        aweight, _, a = heappop(heap)
+        bweight, _, b = heappop(heap)
+        heappush(heap, (aweight + bweight, i, fn(a, b, **kwargs)))
+        i += 1
+    return heap[0][2]
 
 
 # Fibonacci function
@@ -62,6 +62,57 @@ def unbound_cache(func):
     return caching_wrapper
 
 
+def bounded_cache(maxsize=100):
+    """A cache for functions called very often with a limited set of
+    arguments, such as term lookups, where the bookkeeping of
+    :func:`lru_cache` would cost more than it saves.
+
+    This uses ``functools.lru_cache`` from the standard library if it's
+    available, which is fast and safe to share between threads. Otherwise it
+    uses a dictionary that is emptied when it fills up.
+
+    Arguments to the cached function must be hashable.
+    """
+
+    if hasattr(functools, "lru_cache"):
+        return functools.lru_cache(maxsize)
+    return _dict_cache(maxsize)
+
+
+def _dict_cache(maxsize):
+    # Fallback for bounded_cache(). Dictionary lookups and assignments are
+    # atomic, so this doesn't need a lock
+
+    def decorating_function(user_function):
+        stats = [0, 0]  # Hits, misses
+        data = {}
+
+        @functools.wraps(user_function)
+        def wrapper(*args):
+            try:
+                result = data[args]
+                stats[0] += 1
+            except KeyError:
+                stats[1] += 1
+                result = user_function(*args)
+                if len(data) >= maxsize:
+                    data.clear()
+                data[args] = result
+            return result
+
+        def cache_info():
+            return stats[0], stats[1], maxsize, len(data)
+
+        def cache_clear():
+            data.clear()
+            stats[0] = stats[1] = 0
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorating_function
+
+
 def lru_cache(maxsize=100):
     """A simple cache that, when the cache is full, deletes the least recently
     used 10% of the cached values.
@@ -96,8 +147,10 @@ def lru_cache(maxsize=100):
                         del lastused[k]
                 data[args] = user_function(*args)
                 result = data[args]
-            finally:
-                lastused[args] = time()
+            # Only note the time for keys that are in the cache. If the
+            # function raised an exception, a time for the missing key would
+            # later be picked for eviction and fail to delete
+            lastused[args] = time()
             return result
 
         def cache_info():
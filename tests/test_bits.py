@@ -1,5 +1,5 @@
 from whoosh.filedb.filestore import RamStorage
-from whoosh.idsets import BitSet, OnDiskBitSet, SortedIntSet
+from whoosh.idsets import BitSet, OnDiskBitSet, RoaringIdSet, SortedIntSet
 
 
 def test_bit_basics(c=BitSet):
@@ -73,6 +73,21 @@ def test_difference(c=BitSet):
     assert list(b) == [1, 50]
 
 
+def test_bitset_logic():
+    import random
+
+    rand = random.Random(5)
+    xs = set(rand.randint(0, 5000) for _ in range(800))
+    ys = set(rand.randint(0, 3000) for _ in range(800))
+    a, b = BitSet(xs), BitSet(ys)
+    assert list(a | b) == sorted(xs | ys)
+    assert list(a & b) == sorted(xs & ys)
+    assert list(a - b) == sorted(xs - ys)
+    assert list(b - a) == sorted(ys - xs)
+    a.update(b)
+    assert list(a) == sorted(xs | ys)
+
+
 def test_copy(c=BitSet):
     b = c([1, 5, 100, 60])
     assert b == b.copy()
@@ -158,6 +173,54 @@ def test_sortedintset():
     test_before_after(SortedIntSet)
 
 
+def test_roaring():
+    test_bit_basics(RoaringIdSet)
+    test_len(RoaringIdSet)
+    test_union(RoaringIdSet)
+    test_intersection(RoaringIdSet)
+    test_difference(RoaringIdSet)
+    test_copy(RoaringIdSet)
+    test_clear(RoaringIdSet)
+    test_isdisjoint(RoaringIdSet)
+    test_before_after(RoaringIdSet)
+
+
+def test_roaring_containers():
+    # Sparse range, dense range, and a range far past the end
+    nums = ([5, 70000, 70001] + list(range(200000, 210000, 2))
+            + [5000000])
+    rs = RoaringIdSet(nums)
+    assert len(rs) == len(nums)
+    assert list(rs) == nums
+    assert isinstance(rs.idsets[0], SortedIntSet)
+    assert isinstance(rs.idsets[200000 >> 16], BitSet)
+
+    assert 70001 in rs
+    assert 70002 not in rs
+    assert 200002 in rs
+    assert 200003 not in rs
+    assert 5000000 in rs
+    assert 6000000 not in rs
+
+    assert rs.first() == 5
+    assert rs.last() == 5000000
+    assert rs.after(70001) == 200000
+    assert rs.before(200000) == 70001
+    assert rs.after(5000000) is None
+
+    # Dropping below the cutoff turns the dense container back into an array
+    for n in range(200000, 210000, 4):
+        rs.discard(n)
+    assert isinstance(rs.idsets[200000 >> 16], SortedIntSet)
+    assert 200002 in rs
+    assert 200004 not in rs
+    assert len(rs) == len(nums) - 2500
+
+    other = RoaringIdSet([5, 200002, 200006, 5000000, 6000000])
+    assert list(rs & other) == [5, 200002, 200006, 5000000]
+    assert list(rs - other)[:3] == [70000, 70001, 200010]
+
+
 def test_ondisk():
     bs = BitSet([10, 11, 30, 50, 80])
 
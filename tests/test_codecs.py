@@ -54,6 +54,14 @@ def test_termkey():
     assert ("alfa", b("bravo")) in tr
     assert ("alfa", b('\xc3\xa6\xc3\xaf\xc5\xc3\xba')) in tr
     assert ("text", b('\xe6\xa5\xe6\xac\xe8\xaa')) in tr
+    assert ("alfa", b("charlie")) not in tr
+    assert ("nofield", b("bravo")) not in tr
+
+    # Repeated lookups are answered from the reader's cache
+    hits = tr._has_term.cache_info()[0]
+    assert ("alfa", b("bravo")) in tr
+    assert ("alfa", b("charlie")) not in tr
+    assert tr._has_term.cache_info()[0] == hits + 2
     tr.close()
 
 
@@ -159,6 +167,34 @@ def test_termindex():
         assert ti.doc_frequency() == 1
 
 
+def test_terminfo_bytes():
+    from whoosh.codec.whoosh3 import W3TermInfo
+
+    ti = W3TermInfo(weight=6.0, df=3, minlength=1, maxlength=4, maxweight=3.0,
+                    minid=5, maxid=90)
+    ti.set_extent(1000, 24)
+    ti2 = W3TermInfo.from_bytes(ti.to_bytes())
+    assert ti2.weight() == 6.0
+    assert ti2.doc_frequency() == 3
+    assert ti2.min_length() == 1
+    assert ti2.max_length() == 4
+    assert ti2.max_weight() == 3.0
+    assert ti2.min_id() == 5
+    assert ti2.max_id() == 90
+    assert not ti2.is_inlined()
+    assert ti2.extent()[0] == 1000
+
+    ti = W3TermInfo()
+    ti.set_inlined([1, 2], [1.0, 2.0], [b(""), b("")])
+    ti2 = W3TermInfo.from_bytes(ti.to_bytes())
+    assert ti2.min_id() is None
+    assert ti2.max_id() == 0
+    assert ti2.inlined_postings() == ((1, 2), (1.0, 2.0), (b(""), b("")))
+
+    # Term infos are created for every term read, so they don't carry a dict
+    assert not hasattr(ti2, "__dict__")
+
+
 def test_docwriter_one():
     field = fields.TEXT(stored=True)
     st, codec, seg = _make_codec()
@@ -530,6 +566,11 @@ def test_plaintext_codec():
         assert reader.doc_field_length(0, "a") == 3
         assert reader.doc_field_length(2, "a") == 3
 
+        assert reader.frequency("a", u("delta")) == 3
+        assert reader.doc_frequency("a", u("delta")) == 3
+        assert reader.frequency("a", u("zulu")) == 0
+        assert reader.doc_frequency("a", u("zulu")) == 0
+
         cfield = schema["c"]
         assert type(cfield), fields.NUMERIC
         sortables = list(cfield.sortable_terms(reader, "c"))
@@ -619,3 +660,63 @@ def test_memory_multiwrite():
     assert [sf["line"] for sf in reader.all_stored_fields()] == domain
     assert (" ".join(reader.field_terms("line"))
             == "alfa bravo charlie delta echo foxtrot india juliet")
+
+
+def test_memory_ngram_index():
+    from whoosh.codec import memory
+
+    schema = fields.Schema(t=fields.TEXT)
+    codec = memory.MemoryCodec()
+    with codec.writer(schema) as w:
+        w.add_document(t=u("alpha bravo"))
+
+    reader = codec.reader(schema)
+    q = query.Wildcard("t", u("*lph*"))
+    for _ in xrange(reader.NGRAM_SCANS + 1):
+        assert list(q._btexts(reader)) == [b("alpha")]
+
+    # The reader sees terms added after it was opened, so its trigram index
+    # has to be rebuilt
+    with codec.writer(schema) as w:
+        w.add_document(t=u("ralphy"))
+    assert list(q._btexts(reader)) == [b("alpha"), b("ralphy")]
+
+
+def test_memory_phrase_stats():
+    from whoosh.codec import memory
+    from whoosh.searching import Searcher
+
+    schema = fields.Schema(t=fields.TEXT)
+    codec = memory.MemoryCodec()
+    with codec.writer(schema) as w:
+        w.add_document(t=u("alpha bravo"))
+
+    s = Searcher(codec.reader(schema))
+    q = query.Phrase("t", [u("alpha"), u("charlie")])
+    assert list(q.docs(s)) == []
+
+    # The phrase's cached document frequencies are from before the new
+    # document was added
+    with codec.writer(schema) as w:
+        w.add_document(t=u("alpha charlie"))
+    assert list(q.docs(s)) == [1]
+
+
+def test_memory_simplify():
+    from whoosh.codec import memory
+
+    schema = fields.Schema(t=fields.TEXT)
+    codec = memory.MemoryCodec()
+    with codec.writer(schema) as w:
+        w.add_document(t=u("alpha bravo"))
+
+    reader = codec.reader(schema)
+    q = query.And([query.Prefix("t", u("al")), query.Term("t", u("bravo"))])
+    assert q.simplify(reader) == query.And([query.Term("t", u("alpha")),
+                                            query.Term("t", u("bravo"))])
+
+    with codec.writer(schema) as w:
+        w.add_document(t=u("alps bravo"))
+    assert q.simplify(reader) == query.And([
+        query.Or([query.Term("t", u("alpha")), query.Term("t", u("alps"))]),
+        query.Term("t", u("bravo"))])
@@ -321,3 +321,97 @@ def test_varbytes_offsets():
             for i in (10, 100, 1000, 3000):
                 assert cr[i] == values[i % vlen]
 
+
+def test_multireader_single_column():
+    from whoosh.reading import MultiReader
+
+    schema = fields.Schema(a=fields.ID(sortable=True))
+    with TempIndex(schema, "multisinglecol") as ix:
+        with ix.writer(codec=W3Codec()) as w:
+            w.add_document(a=u("alfa"))
+            w.add_document(a=u("bravo"))
+
+        with ix.reader() as r:
+            mr = MultiReader([r])
+            cr = mr.column_reader("a")
+            assert not isinstance(cr, columns.MultiColumnReader)
+            assert len(cr) == 2
+            assert list(cr) == [u("alfa"), u("bravo")]
+            assert cr[1] == u("bravo")
+
+
+def test_multicolumn_lookup():
+    crs = [columns.EmptyColumnReader(n, 3) for n in (1, 2, 3)]
+    mcr = columns.MultiColumnReader(crs)
+    assert [mcr[i] for i in xrange(9)] == [1, 1, 1, 2, 2, 2, 3, 3, 3]
+    assert mcr._reader_and_docnum(4) == (1, 1)
+    assert mcr._reader_and_docnum(8) == (2, 2)
+
+    mcr = columns.MultiColumnReader(crs[:1])
+    assert mcr._reader_and_docnum(2) == (0, 2)
+
+
+def test_multireader_sparse_column():
+    schema = fields.Schema(a=fields.NUMERIC(sortable=True),
+                           i=fields.ID(sortable=True), t=fields.TEXT)
+    with TempIndex(schema, "sparsecol") as ix:
+        with ix.writer() as w:
+            w.add_document(t=u("alfa"))
+            w.add_document(t=u("bravo"))
+        with ix.writer() as w:
+            w.merge = False
+            w.add_document(a=5, i=u("c"))
+            w.add_document(a=7, i=u("d"))
+        with ix.writer() as w:
+            w.merge = False
+            w.add_document(t=u("charlie"))
+
+        with ix.reader() as r:
+            leaves = r.leaf_readers()
+            assert [lr.has_column("a") for lr, _ in leaves] == [False, True,
+                                                               False]
+
+            # The combined column should agree with the segments' own columns
+            # for the documents in the segments without the column
+            def segment_values(method, fieldname="a", **kwargs):
+                values = []
+                for lr, _ in leaves:
+                    cr = lr.column_reader(fieldname, **kwargs)
+                    fn = getattr(cr, method)
+                    values.extend(fn(i) for i in xrange(lr.doc_count_all()))
+                return values
+
+            cr = r.column_reader("a")
+            assert len(cr) == 5
+            assert [cr[i] for i in xrange(5)] == segment_values("__getitem__")
+            assert list(cr) == segment_values("__getitem__")
+            assert cr[2] == 5
+            assert cr[3] == 7
+
+            cr = r.column_reader("a", reverse=True, translate=False)
+            keys = segment_values("sort_key", reverse=True, translate=False)
+            assert [cr.sort_key(i) for i in xrange(5)] == keys
+
+            # The documents without the column sort on the untranslated
+            # default, even though they look up the translated one
+            for fieldname, reverse in (("a", False), ("a", True),
+                                       ("i", False)):
+                cr = r.column_reader(fieldname, reverse=reverse)
+                keys = segment_values("sort_key", fieldname, reverse=reverse)
+                assert [cr.sort_key(i) for i in xrange(5)] == keys
+            cr = r.column_reader("i")
+            assert sorted(cr.sort_key(i) for i in xrange(5)) == [
+                b(""), b(""), b(""), b("c"), b("d")]
+
+
+def test_multicolumn_sparse():
+    crs = [columns.EmptyColumnReader(n, 2) for n in ("a", "b")]
+    mcr = columns.MultiColumnReader.from_sparse([(1, crs[0]), (5, crs[1])], 8,
+                                                default="-")
+    assert len(mcr) == 8
+    assert list(mcr) == ["-", "a", "a", "-", "-", "b", "b", "-"]
+    assert [mcr[i] for i in xrange(8)] == list(mcr)
+
+    mcr = columns.MultiColumnReader.from_sparse([], 3, default="-")
+    assert list(mcr) == ["-", "-", "-"]
+    assert mcr[1] == "-"
@@ -76,6 +76,48 @@ def test_wrapper():
     assert list(wm.all_ids()) == ids
 
 
+def test_multimatcher_skip_to():
+    class CountingMatcher(matching.ListMatcher):
+        nexts = 0
+
+        def next(self):
+            CountingMatcher.nexts += 1
+            matching.ListMatcher.next(self)
+
+        def skip_to(self, id):
+            return matching.Matcher.skip_to(self, id)
+
+    def mm():
+        return matching.MultiMatcher([CountingMatcher(list(range(10))),
+                                      CountingMatcher([]),
+                                      CountingMatcher([0, 3, 5]),
+                                      CountingMatcher([1, 2])], [0, 10, 20, 30])
+
+    m = mm()
+    m.skip_to(23)
+    assert m.id() == 23
+    # The skip shouldn't have stepped through the first sub-matcher
+    assert CountingMatcher.nexts == 1
+    m.skip_to(24)
+    assert m.id() == 25
+    m.skip_to(31)
+    assert m.id() == 31
+    m.next()
+    assert m.id() == 32
+    m.skip_to(40)
+    assert not m.is_active()
+
+    for target in xrange(35):
+        m = mm()
+        m.skip_to(target)
+        expected = [id for id in mm().all_ids() if id >= target]
+        ids = []
+        while m.is_active():
+            ids.append(m.id())
+            m.next()
+        assert ids == expected
+
+
 def test_filter():
     lm = lambda: matching.ListMatcher(list(range(2, 10)))
 
@@ -195,6 +237,27 @@ def test_andnot():
         anm.next()
     assert ls == [90]
 
+    # The negative matcher starts before the positive one, and excludes its
+    # first document
+    anm = matching.AndNotMatcher(matching.ListMatcher([2, 5, 7]),
+                                 matching.ListMatcher([0, 2, 7]))
+    ls = []
+    while anm.is_active():
+        ls.append(anm.id())
+        anm.next()
+    assert ls == [5]
+
+    # Every positive document is excluded
+    anm = matching.AndNotMatcher(matching.ListMatcher([3]),
+                                 matching.ListMatcher([0, 3]))
+    assert not anm.is_active()
+
+    anm = matching.AndNotMatcher(matching.ListMatcher([1, 3]),
+                                 matching.ListMatcher([0, 3]))
+    assert anm.id() == 1
+    anm.skip_to(3)
+    assert not anm.is_active()
+
 
 def test_require():
     lm1 = matching.ListMatcher([1, 4, 10, 20, 90])
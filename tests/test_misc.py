@@ -1,7 +1,9 @@
 from __future__ import with_statement
 import os, threading, time
 
-from whoosh.compat import u
+import pytest
+
+from whoosh.compat import u, xrange
 from whoosh.util.filelock import try_for
 from whoosh.util.numeric import length_to_byte, byte_to_length
 from whoosh.util.testing import TempStorage
@@ -127,6 +129,49 @@ def test_double_barrel_lru():
     # assert test.cache_info() == (0, 0, 5, 0)
 
 
+def test_lru_exception():
+    from whoosh.util.cache import lru_cache
+
+    @lru_cache(5)
+    def test(n):
+        if n < 0:
+            raise KeyError(n)
+        return n * 2
+
+    # A call that raises isn't cached, and doesn't break later evictions
+    with pytest.raises(KeyError):
+        test(-1)
+    assert [test(n) for n in xrange(20)] == [n * 2 for n in xrange(20)]
+    assert test.cache_info()[3] <= 5
+
+
+def test_bounded_cache():
+    from whoosh.util.cache import bounded_cache, _dict_cache
+
+    for decorator in (bounded_cache, _dict_cache):
+        calls = []
+
+        @decorator(5)
+        def test(n):
+            calls.append(n)
+            if n < 0:
+                raise KeyError(n)
+            return n * 2
+
+        assert [test(n) for n in (1, 2, 1, 2)] == [2, 4, 2, 4]
+        assert calls == [1, 2]
+        assert test.cache_info()[:2] == (2, 2)
+
+        # A call that raises isn't cached
+        with pytest.raises(KeyError):
+            test(-1)
+        assert [test(n) for n in xrange(20)] == [n * 2 for n in xrange(20)]
+        assert test.cache_info()[3] <= 5
+
+        test.cache_clear()
+        assert test.cache_info()[3] == 0
+
+
 def test_version_object():
     from whoosh.util.versions import SimpleVersion as sv
 
@@ -159,3 +204,23 @@ def test_version_object():
 
     assert sv(1, 2, 3).to_int() == 17213488128
     assert sv.from_int(17213488128) == sv(1, 2, 3)
+
+
+def test_make_weighted_tree():
+    from whoosh.util import make_weighted_tree
+
+    class Node(object):
+        # Deliberately not orderable
+        def __init__(self, a, b, tag=None):
+            self.a = a
+            self.b = b
+            self.tag = tag
+
+    t = make_weighted_tree(Node, [(3, "c"), (1, "a"), (1, "b"), (5, "d")],
+                           tag="x")
+    # The two lightest items are merged first, then with the next lightest
+    assert t.tag == "x"
+    assert t.a == "d"
+    assert t.b.a.a == "a"
+    assert t.b.a.b == "b"
+    assert t.b.b == "c"
@@ -1,14 +1,16 @@
 from __future__ import with_statement
 import copy
+import re
 
 import pytest
 
-from whoosh import fields, qparser, query
-from whoosh.compat import b, u
+from whoosh import fields, matching, qparser, query
+from whoosh.compat import b, dumps, loads, text_type, u, xrange
 from whoosh.filedb.filestore import RamStorage
 from whoosh.qparser import QueryParser
 from whoosh.query import And
 from whoosh.query import AndMaybe
+from whoosh.query import AndNot
 from whoosh.query import ConstantScoreQuery
 from whoosh.query import DateRange
 from whoosh.query import DisjunctionMax
@@ -60,6 +62,14 @@ def test_existing_terms():
     ts = q.existing_terms(r)
     assert sorted(ts) == [("value", b("alfa")), ("value", b("bravo")), ("value", b("hotel"))]
 
+    # Terms in more than one field, with duplicates
+    q = QueryParser("value", None).parse(u('alfa key:a hotel alfa key:b'))
+    ts = q.existing_terms(r)
+    assert sorted(ts) == [("key", b("a")), ("key", b("b")),
+                          ("value", b("alfa")), ("value", b("hotel"))]
+    ts = q.existing_terms(r, fieldname="key")
+    assert sorted(ts) == [("key", b("a")), ("key", b("b"))]
+
 
 def test_wildcard_existing_terms():
     s = fields.Schema(key=fields.ID, value=fields.TEXT)
@@ -97,6 +107,17 @@ def test_wildcard_existing_terms():
     ts = q.existing_terms(r, expand=True)
     assert words(ts) == b("render rendering renders")
 
+    # The morphological variations of the word are only computed once
+    from whoosh.query.terms import _variations
+    hits = _variations.cache_info()[0]
+    ts = q.existing_terms(r, expand=True)
+    assert words(ts) == b("render rendering renders")
+    assert _variations.cache_info()[0] == hits + 1
+    # The existing variations come out in lexicon order
+    assert list(q._btexts(r)) == [b("render"), b("rendering"), b("renders")]
+    # The cached variations are deduplicated and can't be modified
+    assert isinstance(_variations(u("render")), frozenset)
+
 
 def test_replace():
     q = And([Or([Term("a", "b"), Term("b", "c")], boost=1.2),
@@ -147,9 +168,27 @@ def test_accept():
                          Or([Term("c", u("d")), Phrase("a", [u("e"), u("f")], boost=2.0)]),
                              Phrase("a", [u("g"), u("h")], boost=0.5)])
 
+    # The original tree isn't changed
+    assert before[2].boost == 0.25
+
     before = Phrase("a", [u("b"), u("c")], boost=2.5)
     after = before.accept(boost_phrases)
     assert after == Phrase("a", [u("b"), u("c")], boost=5.0)
+    assert before.boost == 2.5
+
+
+def test_with_boost_copy():
+    q = And([Term("a", u("b")), Phrase("a", [u("c"), u("d")])])
+    bq = q.with_boost(2.0)
+    assert bq.boost == 2.0
+    assert q.boost == 1.0
+
+    # The copy doesn't share its subqueries or word lists with the original
+    bq.subqueries.append(Term("a", u("e")))
+    bq.subqueries[0].text = u("f")
+    bq.subqueries[1].words[0] = u("g")
+    assert len(q.subqueries) == 2
+    assert text_type(q) == u('(a:b AND a:"c d")')
 
 
 def test_simplify():
@@ -219,6 +258,22 @@ def test_normalize_compound():
     assert q == Or([Term("a", u("a")), Term("a", u("b"))])
 
 
+def test_normalize_cached():
+    q = And([Term("a", u("a")), Or([Term("a", u("b")), Term("a", u("c"))]),
+             Not(Term("a", u("d")))])
+    nq = q.normalize()
+    assert q.normalize() is nq
+    assert nq.normalize() is nq
+
+    # Copies don't inherit the cached normal form
+    bq = q.with_boost(2.0)
+    assert bq.normalize().boost == 2.0
+    assert q.normalize() is nq
+
+    assert (hash(And([Term("a", u("a")), Term("a", u("a"))]))
+            != hash(And([])))
+
+
 def test_duplicates():
     q = And([Term("a", u("b")), Term("a", u("b"))])
     assert q.normalize() == Term("a", u("b"))
@@ -240,6 +295,57 @@ def test_duplicates():
     assert q.normalize() == Term("a", u("b"))
 
 
+def test_term_hash_cache():
+    q = Term("a", u("b"))
+    h = hash(q)
+    assert hash(q) == h == hash(Term("a", u("b")))
+
+    q2 = q.replace("a", u("b"), u("c"))
+    assert hash(q2) == hash(Term("a", u("c")))
+    assert hash(q) == h
+
+    q3 = q.with_boost(2.0)
+    assert hash(q3) == hash(Term("a", u("b"), boost=2.0))
+    assert hash(q) == h
+
+    # Pickles keep the plain attributes, not the cached values
+    q4 = loads(dumps(q, -1))
+    assert q4 == q
+    assert "_hash" not in q4.__dict__
+
+
+def test_phrase_hash():
+    q = Phrase("a", [u("b"), u("c")])
+    h = hash(q)
+    assert hash(q) == h == hash(Phrase("a", [u("b"), u("c")]))
+
+    q2 = q.replace("a", u("c"), u("d"))
+    assert hash(q2) == hash(Phrase("a", [u("b"), u("d")]))
+    assert q2 != q
+    assert hash(q) == h
+
+    q.slop = 2
+    assert hash(q) == hash(Phrase("a", [u("b"), u("c")], slop=2))
+
+    # Changing the words in place after hashing still compares and hashes
+    # by the new words
+    q = Phrase("a", [u("b"), u("c")])
+    hash(q)
+    q.words[1] = u("d")
+    assert q == Phrase("a", [u("b"), u("d")])
+    assert q in set([Phrase("a", [u("b"), u("d")])])
+
+
+def test_term_unicode_cache():
+    q = Term("a", u("b"))
+    assert text_type(q) == u("a:b")
+    q = q.replace("a", u("b"), u("c"))
+    assert text_type(q) == u("a:c")
+    q = q.with_boost(2.0)
+    assert text_type(q) == u("a:c^2.0")
+    assert text_type(Or([q, Term("a", u("d"))])) == u("(a:c^2.0 OR a:d)")
+
+
 # TODO: FIX THIS
 
 def test_query_copy_hash():
@@ -296,6 +402,15 @@ def test_query_copy_hash():
        ConstantScoreQuery(Term("a", u("c")), score=2.1))
     do(Require(Term("a", u("b")), Term("c", u("d"))),
        Require(Term("a", u("b"), boost=1.1), Term("c", u("d"))))
+
+    # Order and repetition matter to these hashes
+    ta, tb = Term("a", u("b")), Term("c", u("d"))
+    assert hash(AndNot(ta, tb)) != hash(AndNot(tb, ta))
+    assert hash(AndNot(ta, ta)) != hash(AndNot(tb, tb))
+    assert (hash(Phrase("a", [u("b"), u("c")]))
+            != hash(Phrase("a", [u("c"), u("b")])))
+    assert (hash(Phrase("a", [u("b"), u("b")]))
+            != hash(Phrase("a", [u("c"), u("c")])))
     # do(Require)
     # do(AndMaybe)
     # do(AndNot)
@@ -387,6 +502,44 @@ def test_patterns():
         assert q.simplify(r).__unicode__() == "(word:able OR word:acre OR word:adage OR word:amiga OR word:ampere)"
         assert q._find_prefix(q.text) == "a"
 
+        q = query.Wildcard("word", "*e")
+        assert q.simplify(r).__unicode__() == "(word:able OR word:acre OR word:adage OR word:ampere)"
+
+        q = query.Wildcard("word", "*m?*")
+        assert q.simplify(r).__unicode__() == "(word:akimbo OR word:alembic OR word:amiga OR word:amount OR word:ampere)"
+
+        q = query.Wildcard("word", "a*e*i?")
+        assert q.simplify(r).__unicode__() == "word:alembic"
+
+        # Globs without a prefix scan the lexicon until the field has been
+        # scanned often enough to build the reader's trigram index
+        assert r.NGRAM_SCANS == 3
+        for _ in xrange(2):
+            q = query.Wildcard("word", "*mbo")
+            assert list(q._btexts(r)) == [b("akimbo")]
+            q = query.Wildcard("word", "*?ou*t")
+            assert list(q._btexts(r)) == [b("amount")]
+            q = query.Wildcard("word", "*ige*")
+            assert list(q._btexts(r)) == []
+        assert list(r._ngram_cache) == [("word", 3)]
+        assert "mbo" in r._ngram_index("word")
+
+        # The index can be asked for up front, and the reader only keeps a
+        # couple of them
+        assert "kimb" in r._ngram_index("word", 4, build=True)
+        assert "akimb" in r._ngram_index("word", 5, build=True)
+        assert len(r._ngram_cache) == r.NGRAM_FIELDS == 2
+
+        # The RE2-compatible translation of a glob matches the same terms
+        for glob in (u("a*e*i?"), u("*?ou*t"), u("a.b*"), u("x+y?")):
+            q = query.Wildcard("word", glob)
+            exp = re.compile(q._linear_pattern())
+            fn_exp = re.compile(q._get_pattern())
+            for text in (u("alembic"), u("amount"), u("a.bc"), u("axbc"),
+                         u("x+yz"), u("xxyz")):
+                assert bool(exp.match(text)) == bool(fn_exp.match(text))
+        assert query.Wildcard("word", u("a[bc]*"))._linear_pattern() is None
+
         q = query.Regex("word", "am.*[ae]")
         assert q.simplify(r).__unicode__() == "(word:amiga OR word:ampere)"
         assert q._find_prefix(q.text) == "am"
@@ -406,6 +559,54 @@ def test_patterns():
         assert q._find_prefix(q.text) == "a"
 
 
+def test_large_expansion():
+    schema = fields.Schema(id=fields.STORED, text=fields.KEYWORD)
+    ix = RamStorage().create_index(schema)
+    with ix.writer() as w:
+        for i in range(200):
+            w.add_document(id=i, text=u("w%03d x%d") % (i // 2, i % 3))
+
+    with ix.searcher() as s:
+        q = Prefix("text", u("w"))
+        assert list(q.docs(s)) == list(range(200))
+        assert len(s.search(q, limit=None)) == 200
+
+        q = And([Prefix("text", u("w")), Term("text", u("x1"))])
+        assert list(q.docs(s)) == [i for i in range(200) if i % 3 == 1]
+
+
+def test_large_expansion_scored():
+    schema = fields.Schema(id=fields.STORED, text=fields.TEXT)
+    ix = RamStorage().create_index(schema)
+    with ix.writer() as w:
+        # Enough documents that the expanded terms are unioned into a scored
+        # tree instead of an array
+        for i in range(6000):
+            words = [u("w%03d") % (i % 100)] * (i % 4 + 1)
+            words.append(u("x%d") % (i % 3))
+            w.add_document(id=i, text=u(" ").join(words))
+
+    with ix.searcher() as s:
+        terms = [Term("text", text) for text in s.lexicon("text")
+                 if text.startswith(b("w"))]
+        assert len(terms) >= Prefix.BITMAP_CLAUSES
+
+        def scores(q):
+            return sorted((hit["id"], round(hit.score, 5))
+                          for hit in s.search(q, limit=None))
+
+        # A constant score Prefix is still scored by the searcher's weighting
+        # in a scored search, the same as ORing the terms it expands to
+        assert scores(Prefix("text", u("w"))) == scores(Or(terms))
+        q = And([Prefix("text", u("w")), Term("text", u("x1"))])
+        target = And([Or(terms), Term("text", u("x1"))])
+        assert scores(q) == scores(target)
+
+        r = s.search(Prefix("text", u("w")), limit=5)
+        assert [hit["id"] for hit in r] == [hit["id"] for hit
+                                            in s.search(Or(terms), limit=5)]
+
+
 def test_or_nots1():
     # Issue #285
     schema = fields.Schema(a=fields.KEYWORD(stored=True),
@@ -482,6 +683,168 @@ def test_ornot_andnot():
         assert r1 == r2 == [4]
 
 
+def test_and_with_nots():
+    schema = fields.Schema(id=fields.NUMERIC(stored=True), a=fields.KEYWORD())
+    ix = RamStorage().create_index(schema)
+    with ix.writer() as w:
+        w.add_document(id=0, a=u("foo word1"))
+        w.add_document(id=1, a=u("foo word2"))
+        w.add_document(id=2, a=u("foo bar"))
+        w.add_document(id=3, a=u("foo word1 word2"))
+        w.add_document(id=4, a=u("bar"))
+
+    with ix.searcher() as s:
+        q = And([Term("a", u("foo")), Not(Term("a", u("word1"))),
+                 Not(Term("a", u("word2")))])
+        assert sorted(hit["id"] for hit in s.search(q)) == [2]
+
+        q = And([Term("a", u("foo")), Not(Term("a", u("nope")))])
+        assert sorted(hit["id"] for hit in s.search(q)) == [0, 1, 2, 3]
+
+        q = And([Not(Term("a", u("foo"))), Not(Term("a", u("word1")))])
+        assert [hit["id"] for hit in s.search(q)] == [4]
+
+
+def test_and_with_nots_scored_segments():
+    # In each segment the excluded term is on a lower document than the
+    # first match, so the scored search has to skip the negative matcher up
+    schema = fields.Schema(id=fields.NUMERIC(stored=True), a=fields.KEYWORD())
+    ix = RamStorage().create_index(schema)
+    for base in (0, 10, 20):
+        with ix.writer() as w:
+            w.merge = False
+            w.add_document(id=base, a=u("nope"))
+            w.add_document(id=base + 1, a=u("foo nope"))
+            w.add_document(id=base + 2, a=u("foo bar"))
+            w.add_document(id=base + 3, a=u("foo foo"))
+            w.add_document(id=base + 4, a=u("bar nope"))
+    with ix.writer() as w:
+        w.delete_by_term("a", u("bar"))
+
+    with ix.searcher() as s:
+        assert not s.is_atomic()
+        q = And([Or([Term("a", u("foo")), Term("a", u("bar"))]),
+                 Not(Term("a", u("nope")))])
+        r = s.search(q, limit=None)
+        assert sorted(hit["id"] for hit in r) == [3, 13, 23]
+        assert r.scored_length() == 3
+        docids = sorted(s.stored_fields(d)["id"] for d in q.docs(s))
+        assert docids == [3, 13, 23]
+
+
+def test_and_filter_small():
+    schema = fields.Schema(id=fields.STORED, a=fields.KEYWORD)
+    ix = RamStorage().create_index(schema)
+    with ix.writer() as w:
+        for i in range(300):
+            words = ["all"]
+            if i % 2 == 0:
+                words.append("even")
+            if i % 37 == 0:
+                words.append("rare")
+            w.add_document(id=i, a=u(" ").join(words))
+
+    with ix.searcher() as s:
+        q = And([Term("a", u("all")), Term("a", u("rare"))])
+        assert list(q.docs(s)) == list(range(0, 300, 37))
+        assert isinstance(q.matcher(s, s.boolean_context()),
+                          matching.ListMatcher)
+
+        q = And([Term("a", u("all")), Term("a", u("even")),
+                 Term("a", u("rare"))])
+        target = [i for i in range(0, 300, 37) if i % 2 == 0]
+        assert list(q.docs(s)) == target
+        r = s.search(q, scored=False, limit=None)
+        assert sorted(hit["id"] for hit in r) == target
+
+        q = And([Term("a", u("all")), Term("a", u("rare")),
+                 Term("a", u("nope"))])
+        assert list(q.docs(s)) == []
+
+        # Scored searches still use the intersection matchers
+        q = And([Term("a", u("all")), Term("a", u("rare"))])
+        r = s.search(q, limit=None)
+        assert sorted(hit["id"] for hit in r) == list(range(0, 300, 37))
+
+
+def test_and_filter_nots_nested():
+    schema = fields.Schema(id=fields.STORED, a=fields.KEYWORD)
+    ix = RamStorage().create_index(schema)
+    for base in (0, 150):
+        with ix.writer() as w:
+            w.merge = False
+            for i in range(base, base + 150):
+                words = ["all"]
+                if i % 2 == 0:
+                    words.append("even")
+                if i % 37 == 0:
+                    words.append("rare")
+                if i % 3 == 0:
+                    words.append("three")
+                w.add_document(id=i, a=u(" ").join(words))
+
+    def ids(s, q):
+        return sorted(s.stored_fields(d)["id"] for d in s.docs_for_query(q))
+
+    rare = [i for i in range(300) if i % 37 == 0]
+    with ix.searcher() as s:
+        assert not s.is_atomic()
+        # The filtered intersection is wrapped to exclude the Not, and then
+        # used inside Require and AndNot
+        inner = And([Not(Term("a", u("even"))), Term("a", u("all")),
+                     Term("a", u("rare"))])
+        odd_rare = [i for i in rare if i % 2]
+        assert ids(s, inner) == odd_rare
+
+        q = query.Require(Term("a", u("three")), inner)
+        assert ids(s, q) == [i for i in odd_rare if i % 3 == 0]
+        q = query.AndNot(Term("a", u("three")), inner)
+        assert ids(s, q) == [i for i in range(300)
+                             if i % 3 == 0 and i not in odd_rare]
+
+        # Every document the filter finds is excluded
+        inner = And([Not(Term("a", u("all"))), Term("a", u("all")),
+                     Term("a", u("rare"))])
+        assert ids(s, inner) == []
+        q = query.Require(Term("a", u("three")), inner)
+        assert ids(s, q) == []
+        q = query.AndNot(Term("a", u("rare")), inner)
+        assert ids(s, q) == rare
+
+
+def test_phrase_estimate():
+    schema = fields.Schema(text=fields.TEXT)
+    ix = RamStorage().create_index(schema)
+    with ix.writer() as w:
+        w.add_document(text=u("alfa bravo charlie"))
+        w.add_document(text=u("alfa bravo"))
+        w.add_document(text=u("alfa"))
+
+    with ix.reader() as r:
+        q = Phrase("text", [u("alfa"), u("bravo")])
+        assert q.estimate_size(r) == 2
+        assert q.estimate_min_size(r) == 2
+        q = Phrase("text", [u("alfa"), u("zulu")])
+        assert q.estimate_size(r) == 0
+        assert q.estimate_min_size(r) == 3
+        q = Phrase("nope", [u("alfa"), u("bravo")])
+        assert q.estimate_size(r) == 0
+
+        # The frequencies are cached per reader, but changing the words
+        # invalidates them
+        q = Phrase("text", [u("alfa"), u("bravo")])
+        assert q.estimate_size(r) == 2
+        assert q._stats_cache is not None
+        assert copy.copy(q)._stats_cache is None
+        q.words[1] = u("charlie")
+        assert q.estimate_size(r) == 1
+
+    q = Phrase("text", [u("alfa"), u("bravo")])
+    assert q.normalize() is q
+    q = Phrase("text", [u("alfa"), None, u("bravo")])
+    assert q.normalize() == Phrase("text", [u("alfa"), u("bravo")])
+
+
 def test_none_in_compounds():
     with pytest.raises(query.QueryError):
         _ = query.And([query.Term("a", "b"), None, query.Term("c", "d")])
@@ -598,3 +961,86 @@ def test_andnot_reverse():
 
     assert len(names_fw) == len(names_rv) == 1
     assert names_fw == names_rv
+
+
+def test_every_with_deletions():
+    schema = fields.Schema(id=fields.STORED, text=fields.TEXT)
+    with TempIndex(schema) as ix:
+        with ix.writer() as w:
+            for i, text in enumerate(u("alfa bravo alfa charlie alfa").split()):
+                w.add_document(id=i, text=text)
+        with ix.writer() as w:
+            w.delete_document(2)
+
+        with ix.searcher() as s:
+            m = Every().matcher(s)
+            assert list(m.all_ids()) == [0, 1, 3, 4]
+
+            def ids(q):
+                return sorted(hit["id"] for hit in s.search(q, limit=None))
+
+            alfa = Term("text", u("alfa"))
+            assert ids(Every()) == [0, 1, 3, 4]
+            assert ids(query.Require(alfa, Every())) == [0, 4]
+            assert ids(AndNot(alfa, Every())) == []
+            assert ids(AndNot(Every(), alfa)) == [1, 3]
+            assert ids(And([Every(), alfa])) == [0, 4]
+
+
+def test_every_in_limited_union():
+    schema = fields.Schema(id=fields.STORED, text=fields.TEXT)
+    ix = RamStorage().create_index(schema)
+    with ix.writer() as w:
+        for i in range(300):
+            if i % 3 == 0:
+                # Later documents are shorter, so they score higher
+                text = u("alfa ") + u(" ").join([u("bravo")] * ((300 - i) // 30))
+            else:
+                text = u("bravo charlie")
+            w.add_document(id=i, text=text)
+
+    with ix.searcher() as s:
+        # Every scores each document with its boost, so the union can't drop
+        # it when the top results are pruned
+        q = Or([Every(), Term("text", u("alfa"))])
+        full = [(hit["id"], hit.score) for hit in s.search(q, limit=None)]
+        top = [(hit["id"], hit.score) for hit in s.search(q, limit=5)]
+        assert top == full[:5]
+        assert [docid for docid, _ in top] == [273, 276, 279, 282, 285]
+
+
+def test_boolean_query_factory():
+    from whoosh.query.compound import BooleanQuery
+
+    a, b, c = Term("f", u("a")), Term("f", u("b")), Term("f", u("c"))
+    assert BooleanQuery([], [b], [c]) is NullQuery
+    assert BooleanQuery([a], [], []) == a
+    assert BooleanQuery([a], [b], []) == AndMaybe(a, b)
+    assert BooleanQuery([a], [], [c]) == AndNot(a, c)
+    assert BooleanQuery([a, b], [], [c]) == AndNot(And([a, b]), c)
+    assert BooleanQuery([a], [b], [c]) == AndNot(AndMaybe(a, b), c)
+
+
+def test_existing_terms_sorted_probes():
+    schema = fields.Schema(text=fields.TEXT)
+    with TempIndex(schema) as ix:
+        with ix.writer() as w:
+            w.add_document(text=u("charlie alfa delta bravo"))
+
+        with ix.reader() as r:
+            probes = []
+            contains = r.__contains__
+
+            def recording_contains(term):
+                probes.append(term)
+                return contains(term)
+            r.__contains__ = recording_contains
+
+            q = Or([Phrase("text", [u("delta"), u("zulu"), u("alfa")]),
+                    Term("text", u("charlie")), Term("text", u("alfa"))])
+            ts = q.existing_terms(r, phrases=True)
+            assert ts == set([("text", b("alfa")), ("text", b("charlie")),
+                              ("text", b("delta"))])
+            # Each term is looked up once, in index order
+            assert probes == sorted(set(probes))
+            assert len(probes) == 4
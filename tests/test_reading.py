@@ -3,6 +3,8 @@
 from __future__ import with_statement
 import random, threading, time
 
+import pytest
+
 from whoosh import analysis, fields, formats, reading
 from whoosh.compat import b, u, xrange
 from whoosh.reading import SegmentReader
@@ -181,6 +183,364 @@ def test_stored_fields():
         assert sr.document(a=u("2")) == {"a": u("2"), "b": "b", "d": u("Bravo")}
 
 
+def test_multireader_segment_and_docnum():
+    ix = _multi_segment_index()
+    with ix.reader() as r:
+        assert not r.is_atomic()
+        assert r.doc_offsets == [0, 2, 4]
+        expected = [(0, 0), (0, 1), (1, 0), (1, 1), (2, 0)]
+        assert [r._segment_and_docnum(i) for i in xrange(5)] == expected
+        assert ([r._document_segment(i) for i in xrange(5)]
+                == [seg for seg, _ in expected])
+        assert ([r._reader_and_docnum(i) for i in xrange(5)]
+                == [(r.readers[seg], doc) for seg, doc in expected])
+        assert r.doc_count_all() == 5
+
+    mr = reading.MultiReader([SegmentReader(ix.storage, ix.schema, seg)
+                              for seg in ix._segments()[:1]])
+    assert mr._segment_and_docnum(1) == (0, 1)
+    assert mr._document_segment(1) == 0
+    assert mr._reader_and_docnum(1) == (mr.readers[0], 1)
+    assert mr.doc_count_all() == 2
+    mr.add_reader(SegmentReader(ix.storage, ix.schema, ix._segments()[2]))
+    assert mr.doc_offsets == [0, 2]
+    assert mr.doc_count_all() == 3
+    assert mr.leaf_readers() == [(mr.readers[0], 0), (mr.readers[1], 2)]
+
+    # Build a reader up one segment at a time
+    mr = reading.MultiReader([])
+    assert mr.schema is None
+    for seg in ix._segments():
+        mr.add_reader(SegmentReader(ix.storage, ix.schema, seg))
+    assert mr.schema is ix.schema
+    assert mr.doc_offsets == [0, 2, 4]
+    assert mr.doc_count_all() == 5
+    assert [base for _, base in mr.leaf_readers()] == [0, 2, 4]
+    assert [mr._segment_and_docnum(i) for i in xrange(5)] == expected
+
+
+def test_multireader_term_fanout():
+    ix = _multi_segment_index()
+    with ix.reader() as r:
+        assert not r.is_atomic()
+        # Only in the first segment
+        ti = r.term_info("f1", u("D"))
+        assert (ti.doc_frequency(), ti.min_id(), ti.max_id()) == (1, 1, 1)
+        assert list(r.postings("f1", u("D")).all_ids()) == [1]
+        # In the first and last segments
+        ti = r.term_info("f1", u("B"))
+        assert (ti.doc_frequency(), ti.min_id(), ti.max_id()) == (2, 0, 4)
+        assert list(r.postings("f1", u("B")).all_ids()) == [0, 4]
+
+        # Each caller gets its own copy of the cached info
+        ti._minid = 100
+        assert r.term_info("f1", u("B")).min_id() == 0
+
+        for fieldname, text in (("f1", u("nope")), ("nofield", u("A"))):
+            with pytest.raises(reading.TermNotFound):
+                r.term_info(fieldname, text)
+            with pytest.raises(reading.TermNotFound):
+                r.postings(fieldname, text)
+
+        # Missing terms are cached too, and still raise every time
+        hits = r._term_info.cache_info()[0]
+        with pytest.raises(reading.TermNotFound):
+            r.term_info("f1", u("nope"))
+        assert r._term_info.cache_info()[0] == hits + 1
+
+    # The combined statistics are cached, and recomputed when a reader is
+    # added
+    segs = ix._segments()
+    mr = reading.MultiReader([SegmentReader(ix.storage, ix.schema, segs[0])])
+    for _ in xrange(2):
+        assert mr.frequency("f1", u("A")) == 1
+        assert mr.doc_frequency("f1", u("A")) == 1
+        assert mr.term_info("f1", u("A")).max_id() == 0
+    mr.add_reader(SegmentReader(ix.storage, ix.schema, segs[1]))
+    assert mr.frequency("f1", u("A")) == 5
+    assert mr.doc_frequency("f1", u("A")) == 3
+    assert mr.term_info("f1", u("A")).max_id() == 3
+
+    # A term info from a single segment is shifted on a copy, not in place
+    sr = SegmentReader(ix.storage, ix.schema, segs[2])
+    ti = sr.term_info("f1", u("A"))
+    combined = reading.combine_terminfos([(ti, 4)])
+    assert (combined.min_id(), combined.max_id()) == (4, 4)
+    assert (ti.min_id(), ti.max_id()) == (0, 0)
+
+
+def test_combine_terminfos():
+    tis = [(reading.TermInfo(3, 2, 1, 5, 2.0, 0, 7), 0),
+           (reading.TermInfo(1, 1, 2, 2, 1.0, 3, 3), 10),
+           (reading.TermInfo(4, 3, 3, 9, 1.5, 1, 4), 20)]
+    ti = reading.combine_terminfos(iter(tis))
+    assert ti.weight() == 8
+    assert ti.doc_frequency() == 6
+    assert (ti.min_length(), ti.max_length()) == (1, 9)
+    assert ti.max_weight() == 2.0
+    assert (ti.min_id(), ti.max_id()) == (0, 24)
+    # The order of the sub-readers doesn't matter
+    rti = reading.combine_terminfos(reversed(tis))
+    assert ((rti.weight(), rti.doc_frequency(), rti.min_length(),
+             rti.max_length(), rti.max_weight(), rti.min_id(), rti.max_id())
+            == (8, 6, 1, 9, 2.0, 0, 24))
+    # The originals aren't changed
+    assert (tis[1][0].min_id(), tis[1][0].weight()) == (3, 1)
+
+    assert reading.combine_terminfos([]) is None
+
+    # With a single sub-reader the result is a shifted copy
+    orig = reading.TermInfo(1, 1, 2, 2, 1.0, 3, 3)
+    for _ in xrange(2):
+        ti = reading.combine_terminfos([(orig, 10)])
+        assert ti is not orig
+        assert (ti.min_id(), ti.max_id(), ti.weight()) == (13, 13, 1)
+    assert (orig.min_id(), orig.max_id()) == (3, 3)
+
+
+def test_multireader_cursor():
+    ix = _multi_segment_index()
+    with ix.reader() as r:
+        assert not r.is_atomic()
+        cur = r.cursor("f1")
+        texts = []
+        while cur.is_valid():
+            texts.append(cur.text())
+            cur.next()
+        assert texts == [u("A"), u("B"), u("C"), u("D"), u("E"), u("F")]
+        assert cur.text() is None
+
+        assert cur.find(u("B")) == u("B")
+        ti = cur.term_info()
+        assert (ti.doc_frequency(), ti.min_id(), ti.max_id()) == (2, 0, 4)
+        assert cur.next() == u("C")
+        assert cur.first() == u("A")
+        assert cur.term_info().doc_frequency() == 4
+
+
+def test_multireader_merge_terms():
+    ix = _multi_segment_index()
+    with ix.reader() as r:
+        assert not r.is_atomic()
+        expected = sorted(set(term for sr, _ in r.leaf_readers()
+                              for term in sr.all_terms()))
+        # Sorted, and terms in several segments only come out once
+        assert list(r.all_terms()) == expected
+        assert list(r.terms_from("f2", u("4"))) == [
+            term for term in expected if term >= ("f2", b("4"))]
+
+    mr = reading.MultiReader([])
+    assert list(mr._merge_terms([])) == []
+    terms = [("a", b("x")), ("b", b("y"))]
+    assert list(mr._merge_terms([terms])) == terms
+
+
+def test_removed_field_terms():
+    schema = fields.Schema(a=fields.ID, b=fields.ID, c=fields.ID)
+    schema.add("*_d", fields.ID, glob=True)
+    with TempIndex(schema) as ix:
+        with ix.writer() as w:
+            w.add_document(a=u("alfa"), b=u("bravo"), c=u("charlie"),
+                           x_d=u("delta"))
+            w.add_document(a=u("apple"), b=u("banana"), c=u("cherry"),
+                           x_d=u("date"))
+        with ix.writer() as w:
+            w.remove_field("b")
+
+        with ix.reader() as r:
+            assert r.is_atomic()
+            fieldnames = set(fname for fname, _ in r.all_terms())
+            assert fieldnames == set(["a", "c", "x_d"])
+            assert [term for term, _ in r] == list(r.all_terms())
+            assert list(r.terms_from("a", u("b"))) == [
+                ("c", b("charlie")), ("c", b("cherry")),
+                ("x_d", b("date")), ("x_d", b("delta"))]
+            assert [term for term, _ in r.iter_from("a", u("b"))] == list(
+                r.terms_from("a", u("b")))
+
+
+def test_segment_reader_field_checks():
+    schema = fields.Schema(a=fields.ID, b=fields.STORED)
+    with TempIndex(schema) as ix:
+        with ix.writer() as w:
+            w.add_document(a=u("alfa"), b=u("bravo"))
+
+        with ix.reader() as r:
+            assert r.is_atomic()
+            for _ in xrange(2):
+                assert ("a", u("alfa")) in r
+                assert ("a", u("bravo")) not in r
+                assert ("zz", u("alfa")) not in r
+                assert r.doc_frequency("a", u("alfa")) == 1
+                with pytest.raises(reading.TermNotFound):
+                    r.doc_frequency("zz", u("alfa"))
+                with pytest.raises(reading.TermNotFound):
+                    r.doc_frequency("b", u("bravo"))
+                with pytest.raises(reading.TermNotFound):
+                    r.postings("zz", u("alfa"))
+
+
+def test_stored_fields_removed_field():
+    schema = fields.Schema(a=fields.ID(stored=True), b=fields.STORED,
+                           c=fields.STORED)
+    with TempIndex(schema) as ix:
+        with ix.writer() as w:
+            w.add_document(a=u("alfa"), b=1, c=2)
+            w.add_document(a=u("bravo"), c=3)
+
+        with ix.reader() as r:
+            for _ in xrange(2):
+                assert r.stored_fields(0) == {"a": u("alfa"), "b": 1, "c": 2}
+                assert r.stored_fields(1) == {"a": u("bravo"), "c": 3}
+
+        with ix.writer() as w:
+            w.remove_field("b")
+        with ix.reader() as r:
+            assert r.is_atomic()
+            for _ in xrange(2):
+                assert r.stored_fields(0) == {"a": u("alfa"), "c": 2}
+                assert r.stored_fields(1) == {"a": u("bravo"), "c": 3}
+            assert list(r.iter_docs()) == [(0, {"a": u("alfa"), "c": 2}),
+                                           (1, {"a": u("bravo"), "c": 3})]
+            assert list(r.all_stored_fields()) == [{"a": u("alfa"), "c": 2},
+                                                   {"a": u("bravo"), "c": 3}]
+
+
+def test_iter_docs():
+    schema = fields.Schema(a=fields.ID(stored=True), b=fields.KEYWORD)
+    with TempIndex(schema) as ix:
+        with ix.writer() as w:
+            w.add_document(a=u("alfa"), b=u("x"))
+            # A document without any stored fields
+            w.add_document(b=u("y"))
+            w.add_document(a=u("charlie"), b=u("z"))
+            w.add_document(a=u("delta"), b=u("x"))
+
+        with ix.reader() as r:
+            assert r.is_atomic()
+            docs = [(0, {"a": u("alfa")}), (1, {}), (2, {"a": u("charlie")}),
+                    (3, {"a": u("delta")})]
+            assert list(r.iter_docs()) == docs
+            assert list(r.all_stored_fields()) == [sf for _, sf in docs]
+
+        with ix.writer() as w:
+            w.delete_document(0)
+            w.delete_document(2)
+        with ix.reader() as r:
+            assert r.is_atomic()
+            assert list(r.iter_docs()) == [(1, {}), (3, {"a": u("delta")})]
+            assert list(r.iter_docs()) == [(docnum, r.stored_fields(docnum))
+                                           for docnum in r.all_doc_ids()]
+            assert list(r.all_stored_fields()) == [{}, {"a": u("delta")}]
+
+
+def test_all_doc_ids():
+    ix = _multi_segment_index()
+    with ix.reader() as r:
+        assert not r.is_atomic()
+        assert list(r.all_doc_ids()) == [0, 1, 2, 3, 4]
+
+    with ix.writer() as w:
+        w.delete_document(1)
+        w.delete_document(3)
+        w.merge = False
+    with ix.reader() as r:
+        assert not r.is_atomic()
+        assert list(r.all_doc_ids()) == [0, 2, 4]
+        for sr, offset in r.leaf_readers():
+            assert list(sr.all_doc_ids()) == [
+                docnum for docnum in xrange(sr.doc_count_all())
+                if not sr.is_deleted(docnum)]
+
+
+def test_postings_deleted_cache():
+    schema = fields.Schema(id=fields.STORED, text=fields.KEYWORD)
+    with TempIndex(schema) as ix:
+        with ix.writer() as w:
+            for i in xrange(5):
+                w.add_document(id=i, text=u("alfa bravo"))
+        with ix.writer() as w:
+            w.delete_document(1)
+
+        with ix.reader() as r:
+            assert r.is_atomic()
+            assert list(r.postings("text", u("alfa")).all_ids()) == [0, 2, 3, 4]
+            deleted = r._deleted_set()
+            assert list(r.postings("text", u("bravo")).all_ids()) == [0, 2, 3, 4]
+            assert r._deleted_set() is deleted
+
+        # Deleting documents with the writer's own reader open picks up the
+        # new deletions
+        with ix.writer() as w:
+            with w.searcher() as s:
+                r = s.reader()
+                assert list(r.postings("text", u("alfa")).all_ids()) == [
+                    0, 2, 3, 4]
+                w.delete_document(3)
+                assert list(r.postings("text", u("alfa")).all_ids()) == [
+                    0, 2, 4]
+
+
+def test_expand_prefix_limits():
+    from whoosh.reading import _prefix_limit
+
+    assert _prefix_limit(b("")) is None
+    assert _prefix_limit(b("ab")) == b("ac")
+    assert _prefix_limit(b("a\xff\xff")) == b("b")
+    assert _prefix_limit(b("\xff")) is None
+
+    words = u("a ab abc abd abz ac b ba bb c")
+    schema = fields.Schema(w=fields.KEYWORD, x=fields.KEYWORD)
+    with TempIndex(schema) as ix:
+        with ix.writer() as w:
+            w.add_document(w=words, x=u("a ab"))
+        with ix.reader() as r:
+            assert r.is_atomic()
+            mr = reading.MultiReader([r])
+            for reader in (r, mr):
+                def exp(prefix):
+                    return [t.decode("ascii") for t
+                            in reader.expand_prefix("w", prefix)]
+
+                assert exp("ab") == ["ab", "abc", "abd", "abz"]
+                assert exp("a") == ["a", "ab", "abc", "abd", "abz", "ac"]
+                assert exp("b") == ["b", "ba", "bb"]
+                assert exp("c") == ["c"]
+                assert exp("") == words.split()
+                assert exp("d") == []
+
+
+def test_iter_postings():
+    schema = fields.Schema(text=fields.TEXT)
+    with TempIndex(schema) as ix:
+        with ix.writer() as w:
+            # Enough documents for the postings to span several blocks
+            for i in xrange(300):
+                w.add_document(text=u("alfa bravo") if i % 3
+                               else u("alfa alfa charlie"))
+        with ix.writer() as w:
+            w.delete_document(4)
+            w.delete_document(150)
+
+        with ix.reader() as r:
+            assert r.is_atomic()
+            expected = []
+            for fieldname, btext in r.all_terms():
+                m = r.postings(fieldname, btext)
+                while m.is_active():
+                    expected.append((fieldname, btext, m.id(), m.weight(),
+                                     m.value()))
+                    m.next()
+            assert len(expected) == 596
+            assert list(r.iter_postings()) == expected
+
+            # A matcher that has already read some postings continues from
+            # where it is
+            m = r.postings("text", u("alfa"))
+            m.skip_to(200)
+            assert [p[0] for p in m.all_postings()] == list(xrange(200, 300))
+
+
 def test_stored_fields2():
     schema = fields.Schema(content=fields.TEXT(stored=True),
                            title=fields.TEXT(stored=True),
@@ -275,6 +635,40 @@ def test_first_id():
     assert r.stored_fields(docid) == {"path": "/e"}
 
 
+def test_first_id_deletions():
+    schema = fields.Schema(id=fields.ID(stored=True), tag=fields.ID)
+    ix = RamStorage().create_index(schema)
+    with ix.writer() as w:
+        w.add_document(id=u("1"), tag=u("x"))
+        w.add_document(id=u("2"), tag=u("x"))
+        w.add_document(id=u("3"), tag=u("y"))
+
+    with ix.reader() as r:
+        assert r.first_id("tag", u("x")) == 0
+        assert r.first_id("tag", u("y")) == 2
+        with pytest.raises(reading.TermNotFound):
+            r.first_id("tag", u("z"))
+
+    # The first document with the term is deleted, so the first ID has to
+    # come from the postings instead of the term info
+    with ix.writer() as w:
+        w.delete_by_term("id", u("1"))
+    with ix.reader() as r:
+        assert r.has_deletions()
+        assert r.first_id("tag", u("x")) == 1
+
+    # The only document with the term in the first segment is deleted, so the
+    # answer comes from the second segment
+    with ix.writer() as w:
+        w.merge = False
+        w.delete_by_term("id", u("3"))
+        w.add_document(id=u("4"), tag=u("y"))
+    with ix.reader() as r:
+        assert not r.is_atomic()
+        docid = r.first_id("tag", u("y"))
+        assert r.stored_fields(docid) == {"id": "4"}
+
+
 class RecoverReader(threading.Thread):
     def __init__(self, ix):
         threading.Thread.__init__(self)
@@ -482,6 +876,32 @@ def test_term_inspection_segment_reader():
         _check_inspection_results(ix)
 
 
+def test_term_stats_segment_reader():
+    schema = fields.Schema(a=fields.KEYWORD, b=fields.KEYWORD)
+    with TempIndex(schema) as ix:
+        with ix.writer() as w:
+            # "alfa" is in enough documents that its postings aren't inlined
+            # in the term info
+            for i in xrange(300):
+                w.add_document(a=u("alfa alfa apple"), b=u("zulu"))
+            w.add_document(a=u("bravo zulu"), b=u("alfa"))
+
+        with ix.reader() as r:
+            assert r.is_atomic()
+            stats = list(r._prefix_stats("a", ""))
+            assert stats == [(text, ti.weight(), ti.doc_frequency())
+                             for text, ti in r.iter_prefix("a", "")]
+            assert stats == [(b("alfa"), 600, 300), (b("apple"), 300, 300),
+                             (b("bravo"), 1, 1), (b("zulu"), 1, 1)]
+            assert list(r._prefix_stats("a", "a")) == stats[:2]
+            assert list(r._prefix_stats("b", "z")) == [(b("zulu"), 300, 300)]
+
+            assert r.most_frequent_terms("a", 2) == [(600, b("alfa")),
+                                                     (300, b("apple"))]
+            assert r.most_distinctive_terms("a", 1)[0][1] in (b("bravo"),
+                                                              b("zulu"))
+
+
 def test_term_inspection_multi_reader():
     schema = fields.Schema(title=fields.TEXT(stored=True),
                            content=fields.TEXT)
@@ -500,3 +920,63 @@ def test_term_inspection_multi_reader():
             w.merge = False
 
         _check_inspection_results(ix)
+
+        with ix.reader() as r:
+            assert not r.is_atomic()
+            assert [(text, ti.doc_frequency()) for text, ti
+                    in r.iter_prefix("content", "b")] == [(b("bb"), 2)]
+            # The last term in a field
+            assert [text for text, _ in r.iter_prefix("content", "e")] == [
+                b("ee")]
+            assert [text for text, _ in r.iter_prefix("title", "o")] == [
+                b("other")]
+            assert list(r.iter_prefix("title", "z")) == []
+
+
+def test_multireader_cached_flags():
+    schema = fields.Schema(id=fields.ID(stored=True, sortable=True),
+                           text=fields.TEXT)
+    with TempIndex(schema, "mrflags") as ix:
+        with ix.writer() as w:
+            w.add_document(id=u("a"), text=u("alfa"))
+            w.add_document(id=u("b"), text=u("bravo"))
+        with ix.writer() as w:
+            w.merge = False
+            w.add_document(id=u("c"), text=u("charlie"))
+            w.delete_by_term("id", u("a"))
+
+        with ix.reader() as r:
+            assert not r.is_atomic()
+            assert r.has_deletions()
+            assert r.has_deletions()
+            assert r.has_column("id")
+            assert not r.has_column("text")
+            assert r._hascolumn == {"id": True, "text": False}
+
+            mr = reading.MultiReader([r.readers[1]])
+            assert not mr.has_deletions()
+            mr.add_reader(r.readers[0])
+            assert mr.has_deletions()
+
+
+def test_multireader_deletions_through_writer():
+    schema = fields.Schema(id=fields.ID(stored=True), text=fields.TEXT)
+    with TempIndex(schema, "mrwdel") as ix:
+        with ix.writer() as w:
+            w.add_document(id=u("a"), text=u("alfa"))
+            w.add_document(id=u("b"), text=u("bravo"))
+        with ix.writer() as w:
+            w.merge = False
+            w.add_document(id=u("c"), text=u("charlie"))
+
+        w = ix.writer()
+        try:
+            with w.searcher() as s:
+                r = s.reader()
+                assert not r.is_atomic()
+                assert not r.has_deletions()
+                w.delete_document(1)
+                assert r.is_deleted(1)
+                assert r.has_deletions()
+        finally:
+            w.cancel()
@@ -646,6 +646,33 @@ def test_phrase_order():
         assert result(q) == [u('ape bay can day'), u('bay can day ape')]
 
 
+def test_phrase_common_first():
+    schema = fields.Schema(id=fields.STORED, text=fields.TEXT(stored=True))
+    ix = RamStorage().create_index(schema)
+    with ix.writer() as w:
+        for i in range(50):
+            w.add_document(id=i, text=u("big cat sat on big mat"))
+        w.add_document(id=50, text=u("big aardvark sat"))
+        w.add_document(id=51, text=u("aardvark big sat"))
+
+    with ix.searcher() as s:
+        # The common word comes first, but the rare word still has to follow
+        # it in the phrase
+        q = query.Phrase("text", [u("big"), u("aardvark")])
+        assert [hit["id"] for hit in s.search(q)] == [50]
+        q = query.Phrase("text", [u("aardvark"), u("big")])
+        assert [hit["id"] for hit in s.search(q)] == [51]
+        q = query.Phrase("text", [u("big"), u("zebra")])
+        assert not q.matcher(s).is_active()
+
+        # The two rarest words are intersected innermost
+        q = query.Phrase("text", [u("big"), u("aardvark"), u("sat")])
+        isect = q.matcher(s).child
+        assert isect.a.term() == ("text", b("sat"))
+        assert isect.b.a.term() == ("text", b("aardvark"))
+        assert isect.b.b.term() == ("text", b("big"))
+
+
 def test_phrase_sameword():
     schema = fields.Schema(id=fields.STORED, text=fields.TEXT)
     storage = RamStorage()
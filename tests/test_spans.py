@@ -238,6 +238,29 @@ def test_spannear2():
             assert ids == "bcd"
 
 
+def test_spannear2_ordered():
+    ix = get_index()
+    words = ["bravo", "charlie", "delta"]
+    with ix.searcher() as s:
+        for slop in (1, 2, 3):
+            q = spans.SpanNear2([Term("text", w) for w in words], slop=slop)
+            m = q.matcher(s)
+            found = {}
+            while m.is_active():
+                found[m.id()] = [(sp.start, sp.end) for sp in m.spans()]
+                m.next()
+
+            for docnum, fs in s.iter_docs():
+                ls = fs["text"]
+                target = set()
+                for i in xrange(len(ls)):
+                    for j in xrange(i + 1, min(i + slop + 1, len(ls))):
+                        for k in xrange(j + 1, min(j + slop + 1, len(ls))):
+                            if [ls[i], ls[j], ls[k]] == words:
+                                target.add((i, k))
+                assert found.get(docnum, []) == sorted(target)
+
+
 def test_span_not():
     ix = get_index()
     with ix.searcher() as s:
@@ -358,3 +381,32 @@ def test_span_characters():
                 startchar, endchar = span.startchar, span.endchar
                 assert orig[startchar:endchar] == "bravo echo"
             m.next()
+
+
+def test_term_pair_matcher():
+    ix = get_index()
+    with ix.searcher() as s:
+        for slop in (1, 2, 3):
+            for a, b in permutations(("alfa", "bravo", "echo"), 2):
+                pq = Phrase("text", [a, b], slop=slop)
+                m = pq.matcher(s)
+                assert isinstance(m, spans.SpanNear2.TermPairMatcher)
+
+                ms = [Term("text", a).matcher(s), Term("text", b).matcher(s)]
+                gm = spans.SpanNear2.SpanNear2Matcher(ms, slop=slop)
+
+                # The specialized matcher finds the same documents and spans
+                # (including the characters) as the general one
+                expected = []
+                while gm.is_active():
+                    expected.append((gm.id(), [(sp.start, sp.end, sp.startchar,
+                                                sp.endchar)
+                                               for sp in gm.spans()]))
+                    gm.next()
+                found = []
+                while m.is_active():
+                    found.append((m.id(), [(sp.start, sp.end, sp.startchar,
+                                            sp.endchar)
+                                           for sp in m.spans()]))
+                    m.next()
+                assert found == expected
@@ -4,7 +4,8 @@ import gzip
 from whoosh import analysis, fields, highlight, query, spelling
 from whoosh.compat import b, u, permutations
 from whoosh.qparser import QueryParser
-from whoosh.support.levenshtein import levenshtein
+from whoosh.support.levenshtein import damerau_levenshtein, distance
+from whoosh.support.levenshtein import levenshtein, within
 from whoosh.util.testing import TempIndex
 
 
@@ -41,6 +42,68 @@ def test_automaton():
             assert sugs == target
 
 
+def test_within():
+    words = _wordlist + ["recation", "reaction", "a", "", "transportation",
+                         "transportations", "transpiration"]
+    for typo in ("reoction", "recation", "reaciton", "fractoin", "a", "",
+                 "transportaiton"):
+        for maxdist in (0, 1, 2, 3):
+            target = [w for w in words
+                      if damerau_levenshtein(typo, w) <= maxdist]
+            assert list(within(typo, words, maxdist)) == target
+            assert list(within(typo, sorted(words), maxdist)) == sorted(target)
+
+
+def test_distance_limit():
+    words = _wordlist + ["recation", "a", ""]
+    for typo in ("reoction", "recation", "fractoin", "a", ""):
+        for word in words:
+            d = damerau_levenshtein(typo, word)
+            for limit in (0, 1, 2, 3):
+                k = damerau_levenshtein(typo, word, limit=limit)
+                if d <= limit:
+                    assert k == d
+                else:
+                    assert k == limit + 1
+
+
+def test_multireader_terms_within():
+    schema = fields.Schema(text=fields.TEXT)
+    with TempIndex(schema, "multiwithin") as ix:
+        half = len(_wordlist) // 2
+        with ix.writer() as w:
+            w.add_document(text=u" ".join(_wordlist[:half]))
+        with ix.writer() as w:
+            w.merge = False
+            w.add_document(text=u" ".join(_wordlist[half:]))
+
+        with ix.reader() as r:
+            assert not r.is_atomic()
+            typo = "reoction"
+            sugs = list(r.terms_within("text", typo, maxdist=2))
+            target = [w for w in _wordlist if distance(typo, w) <= 2]
+            assert sugs == target
+
+
+def test_multireader_terms_within_overlap():
+    # Words in more than one segment are merged before the distances are
+    # computed, so each one is only checked and returned once
+    schema = fields.Schema(text=fields.TEXT)
+    with TempIndex(schema, "multiwithinoverlap") as ix:
+        for words in (_wordlist[:12], _wordlist[6:], _wordlist[3:9]):
+            with ix.writer() as w:
+                w.merge = False
+                w.add_document(text=u" ".join(words))
+
+        with ix.reader() as r:
+            assert not r.is_atomic()
+            assert len(r.readers) == 3
+            for typo in ("reoction", "recation", "fractoin"):
+                sugs = list(r.terms_within("text", typo, maxdist=2))
+                target = [w for w in _wordlist if distance(typo, w) <= 2]
+                assert sugs == target
+
+
 def test_reader_corrector():
     schema = fields.Schema(text=fields.TEXT())
     with TempIndex(schema) as ix:
@@ -147,6 +147,28 @@ def test_ordered_closest():
         hr.close()
 
 
+def test_ordered_items_chunks():
+    # Items are read from the file in chunks, so use enough data (including
+    # values bigger than a chunk) that items straddle the chunk boundaries
+    keys = [b("%06d" % i) for i in xrange(3000)]
+    values = [b("v") * ((i * 37) % 200) for i in xrange(3000)]
+    values[100] = values[2000] = b("x") * 100000
+
+    with TempStorage("orderedchunks") as st:
+        hw = OrderedHashWriter(st.create_file("test.hsh"))
+        hw.add_all(zip(keys, values))
+        hw.close()
+
+        hr = OrderedHashReader.open(st, "test.hsh")
+        assert list(hr.items()) == list(zip(keys, values))
+        assert list(hr.keys()) == keys
+        assert list(hr.values()) == values
+        assert list(hr.items_from(b("001500"))) == list(zip(keys, values))[1500:]
+        assert list(hr.keys_from(b("0029985"))) == keys[2999:]
+        assert list(hr.items_from(b("9"))) == []
+        hr.close()
+
+
 def test_extras():
     st = RamStorage()
     hw = HashWriter(st.create_file("test"))
@@ -32,6 +32,21 @@ def test_vector_reading():
             assert list(r.vector_as("frequency", 0, "content")) == [(u('black'), 1), (u('hole'), 1), (u('story'), 2)]
 
 
+def test_long_vector_as():
+    schema = fields.Schema(content=fields.KEYWORD(vector=formats.Frequency()))
+    words = ["w%03d" % i for i in range(300)]
+    with TempIndex(schema, "longvectoras") as ix:
+        with ix.writer() as w:
+            w.add_document(content=u(" ".join(words + words[:10])))
+
+        with ix.reader() as r:
+            freqs = list(r.vector_as("frequency", 0, "content"))
+            assert [t for t, _ in freqs] == [u(w) for w in words]
+            assert [f for _, f in freqs] == [2] * 10 + [1] * 290
+            weights = list(r.vector_as("weight", 0, "content"))
+            assert weights == [(t, float(f)) for t, f in freqs]
+
+
 def test_vector_merge():
     schema = fields.Schema(title=fields.TEXT,
                            content=fields.TEXT(vector=formats.Frequency()))
@@ -79,3 +79,20 @@ def test_compatibility():
     s = ix.searcher(weighting=LegacyWeighting())
     r = s.search(query.Term("text", u("bravo")))
     assert r.score(0) == 2.25
+
+
+def test_bm25f_folded_constants():
+    schema = fields.Schema(text=fields.TEXT)
+    ix = RamStorage().create_index(schema)
+    with ix.writer() as w:
+        w.add_document(text=u("alfa bravo alfa"))
+        w.add_document(text=u("alfa charlie delta echo foxtrot"))
+        w.add_document(text=u("bravo"))
+
+    with ix.searcher(weighting=scoring.BM25F(B=0.5, K1=1.5)) as s:
+        scorer = s.weighting.scorer(s, "text", u("alfa"))
+        idf = s.idf("text", u("alfa"))
+        avgfl = s.avg_field_length("text")
+        for weight, length in [(1, 1), (2, 3), (1, 5), (5, 40)]:
+            expected = scoring.bm25(idf, weight, length, avgfl, 0.5, 1.5)
+            assert abs(scorer._score(weight, length) - expected) < 1e-9